@@ -1,11 +1,10 @@
 from typing import Annotated, AsyncIterator
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode
 from typing_extensions import TypedDict
-from langchain_core.messages import SystemMessage
-import os
+from langchain_core.messages import SystemMessage, ToolMessage
 from dotenv import load_dotenv
 
 # 加载环境变量
@@ -14,31 +13,18 @@ load_dotenv()
 try:
     from .tools import get_tools
     from .skill_loader import SkillLoader
+    from .llm_pool import ainvoke_hedged, get_chat_model, hedge_after_seconds
+    from .speculative import SpeculativeExecutor, speculative_tools_enabled
 except ImportError:
     from tools import get_tools
     from skill_loader import SkillLoader
+    from llm_pool import ainvoke_hedged, get_chat_model, hedge_after_seconds
+    from speculative import SpeculativeExecutor, speculative_tools_enabled
 
 class State(TypedDict):
     messages: Annotated[list, add_messages]
 
-def create_agent():
-    """创建 LangGraph Agent（集成 A2UI Skill）"""
-
-    # 1. 加载 A2UI skill
-    loader = SkillLoader()
-    skill_result = loader.load_skill("a2ui")
-
-    if not skill_result["success"]:
-        print(f"⚠️  Warning: Failed to load A2UI skill: {skill_result.get('error')}")
-        system_message_content = "You are a helpful assistant."
-    else:
-        print(f"✅ Successfully loaded skill: {skill_result['name']}")
-        # 2. 构建 System Message（注入 skill）
-        system_message_content = f"""You are a helpful assistant that can generate rich UI interfaces using A2UI protocol.
-
-{skill_result['content']}
-
-## IMPORTANT OUTPUT FORMAT
+A2UI_OUTPUT_FORMAT = """## IMPORTANT OUTPUT FORMAT
 
 When generating UI, your output MUST follow this format:
 
@@ -61,23 +47,76 @@ Generate A2UI JSON when:
 - User wants forms, buttons, or UI components
 """
 
-    # 3. 从环境变量读取配置
-    llm = ChatOpenAI(
-        model=os.getenv("MODEL_NAME", "claude-sonnet-4-5-20250929"),
-        base_url=os.getenv("OPENAI_BASE_URL"),
-        api_key=os.getenv("OPENAI_API_KEY"),
-        temperature=0.7,
-        streaming=True
-    )
+# 结果适合用 A2UI 渲染的工具：对话里出现了它们的结果时，即使用户消息没有命中 a2ui skill，
+# 也注入 A2UI 规范和输出格式，避免模型拿到天气数据却不知道如何输出卡片
+UI_CAPABLE_TOOLS = frozenset({"get_weather", "get_component", "search_components", "list_available_components"})
+
+def has_ui_tool_result(messages: list) -> bool:
+    """对话中是否已有 UI_CAPABLE_TOOLS 的工具结果"""
+    return any(isinstance(m, ToolMessage) and m.name in UI_CAPABLE_TOOLS for m in messages)
+
+def _load_a2ui_skill(loader: SkillLoader) -> list[dict]:
+    skill_result = loader.load_skill("a2ui")
+    if skill_result["success"]:
+        return [skill_result]
+    print(f"⚠️  Warning: Failed to load A2UI skill: {skill_result.get('error')}")
+    return []
+
+def build_system_message(query: str | None = None, ui_tool_used: bool = False) -> str:
+    """构建 System Message（注入 skill）
+
+    传入 query 时只注入与本次请求相关的 skill / section，纯文本问答不携带 A2UI 规范和输出格式；
+    不传时保持旧行为，完整注入 a2ui skill。
+    ui_tool_used 为 True（对话里已有 UI_CAPABLE_TOOLS 的结果）时，a2ui 未被选中也会完整注入。
+    """
+    loader = SkillLoader()
+    skills = _load_a2ui_skill(loader) if query is None else loader.select_skills(query)
+    if ui_tool_used and not any(skill["name"] == "a2ui" for skill in skills):
+        skills += _load_a2ui_skill(loader)
+
+    for skill in skills:
+        print(f"✅ Selected skill: {skill['name']} (sections: {', '.join(skill['sections']) or 'all'})")
+
+    needs_a2ui = any(skill["name"] == "a2ui" for skill in skills)
+    if needs_a2ui:
+        intro = "You are a helpful assistant that can generate rich UI interfaces using A2UI protocol."
+        outro = A2UI_OUTPUT_FORMAT
+    else:
+        intro = "You are a helpful assistant."
+        outro = ""
+
+    parts = [intro, *(skill["content"] for skill in skills), outro]
+    return "\n\n".join(part for part in parts if part).rstrip() + "\n"
+
+def create_agent(query: str | None = None, speculative: SpeculativeExecutor | None = None):
+    """创建 LangGraph Agent（按请求内容集成相关 Skill）
+
+    传入 speculative 时，只读工具会在 tool call 参数流式完整后提前执行，tools 节点复用其结果。
+    """
 
     tools = get_tools()
-    # 绑定工具到 LLM
-    llm_with_tools = llm.bind_tools(tools)
 
-    def call_model(state: State):
+    # 1-2. 挑选 skill 并构建 System Message；出现 UI 工具结果后换成带 A2UI 规范的版本（按需构建一次）
+    system_messages = {False: build_system_message(query)}
+
+    def system_message_for(messages: list) -> str:
+        ui_tool_used = has_ui_tool_result(messages)
+        if ui_tool_used not in system_messages:
+            system_messages[ui_tool_used] = build_system_message(query, ui_tool_used=True)
+        return system_messages[ui_tool_used]
+
+    hedge_after = hedge_after_seconds()
+
+    async def call_model(state: State, config: RunnableConfig):
+        # 3. 复用进程级共享的 ChatOpenAI 与连接池（配置来自环境变量），绑定工具
+        llm_with_tools = get_chat_model().bind_tools(tools)
         # 注入 System Message
-        messages = [SystemMessage(content=system_message_content)] + state["messages"]
-        response = llm_with_tools.invoke(messages)
+        messages = [SystemMessage(content=system_message_for(state["messages"]))] + state["messages"]
+        on_chunk = None
+        if speculative is not None:
+            speculative.reset()
+            on_chunk = speculative.observe
+        response = await ainvoke_hedged(llm_with_tools, messages, hedge_after, config=config, on_chunk=on_chunk)
         return {"messages": [response]}
 
     def should_continue(state: State):
@@ -89,7 +128,14 @@ Generate A2UI JSON when:
     # 构建图
     graph = StateGraph(State)
     graph.add_node("agent", call_model)
-    graph.add_node("tools", ToolNode(tools))
+    tool_node = ToolNode(tools)
+    if speculative is not None:
+        async def call_tools(state: State, config: RunnableConfig):
+            return await speculative.run_tools(state["messages"][-1], tool_node, config)
+
+        graph.add_node("tools", call_tools)
+    else:
+        graph.add_node("tools", tool_node)
 
     graph.add_edge(START, "agent")
     graph.add_conditional_edges("agent", should_continue)
@@ -102,10 +148,20 @@ async def run_agent_stream(
     conversation_id: str | None = None
 ) -> AsyncIterator[dict]:
     """流式运行 Agent"""
-    agent = create_agent()
-
-    async for event in agent.astream_events(
-        {"messages": [{"role": "user", "content": message}]},
-        version="v2"
-    ):
-        yield event
\ No newline at end of file
+    speculative = SpeculativeExecutor(get_tools()) if speculative_tools_enabled() else None
+    agent = create_agent(message, speculative)
+
+    try:
+        async for event in agent.astream_events(
+            {"messages": [{"role": "user", "content": message}]},
+            version="v2"
+        ):
+            yield event
+    finally:
+        if speculative is not None:
+            speculative.reset()
+            stats = speculative.report()
+            print(
+                f"🔮 Speculative tools: {stats['hits']}/{stats['speculated']} hits "
+                f"(hit rate {stats['hit_rate']:.0%}), saved {stats['saved_seconds']:.3f}s"
+            )
\ No newline at end of file
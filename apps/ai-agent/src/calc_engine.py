@@ -0,0 +1,453 @@
+"""受限表达式引擎：供 calculator 工具使用。
+
+表达式只解析一次：AST 白名单校验 -> 改写幂运算/列表字面量 -> compile 成 code 对象，
+结果放在 LRU 缓存里，重复表达式（比如同一张图表反复刷新）直接复用。
+
+数组参数按向量化方式求值：一次调用就能算完整条图表序列，
+而不是让模型逐个数值调用工具。安装了 numpy 时走 numpy，否则用纯 Python 的 _Series 兜底。
+"""
+
+import ast
+import math
+import operator
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable
+
+# numpy 是可选依赖：未安装时数组运算退化为纯 Python 逐元素实现
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None  # type: ignore
+
+MAX_EXPRESSION_LENGTH = 1000
+MAX_ARRAY_LENGTH = 100_000
+MAX_POW_EXPONENT = 1000
+# 整数结果的位数上限：大整数乘方/乘法在计算前先估算结果大小，避免把进程卡死
+MAX_INT_BITS = 10_000
+COMPILE_CACHE_SIZE = 256
+
+
+class ExpressionError(ValueError):
+    """表达式非法或求值失败"""
+
+
+_ALLOWED_BINOPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+_ALLOWED_UNARYOPS = (ast.UAdd, ast.USub)
+
+
+class _Series:
+    """无 numpy 时的一维数组：支持与标量/等长数组的逐元素运算"""
+
+    __slots__ = ("values",)
+
+    def __init__(self, values: Iterable[Any]):
+        self.values = [float(v) for v in values]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def _zip(self, other: Any, op: Callable[[Any, Any], Any], reverse: bool = False) -> "_Series":
+        if isinstance(other, _Series):
+            if len(other) != len(self):
+                raise ExpressionError(f"数组长度不一致: {len(self)} vs {len(other)}")
+            pairs = zip(other.values, self.values) if reverse else zip(self.values, other.values)
+            return _Series(op(a, b) for a, b in pairs)
+        if reverse:
+            return _Series(op(other, v) for v in self.values)
+        return _Series(op(v, other) for v in self.values)
+
+    def __add__(self, other): return self._zip(other, operator.add)
+    def __radd__(self, other): return self._zip(other, operator.add, reverse=True)
+    def __sub__(self, other): return self._zip(other, operator.sub)
+    def __rsub__(self, other): return self._zip(other, operator.sub, reverse=True)
+    def __mul__(self, other): return self._zip(other, operator.mul)
+    def __rmul__(self, other): return self._zip(other, operator.mul, reverse=True)
+    def __truediv__(self, other): return self._zip(other, operator.truediv)
+    def __rtruediv__(self, other): return self._zip(other, operator.truediv, reverse=True)
+    def __floordiv__(self, other): return self._zip(other, operator.floordiv)
+    def __rfloordiv__(self, other): return self._zip(other, operator.floordiv, reverse=True)
+    def __mod__(self, other): return self._zip(other, operator.mod)
+    def __rmod__(self, other): return self._zip(other, operator.mod, reverse=True)
+    def __pow__(self, other): return self._zip(other, _safe_pow)
+    def __rpow__(self, other): return self._zip(other, _safe_pow, reverse=True)
+    def __neg__(self): return _Series(-v for v in self.values)
+    def __pos__(self): return self
+
+
+def _is_array(value: Any) -> bool:
+    if np is not None and isinstance(value, np.ndarray):
+        return True
+    return isinstance(value, _Series)
+
+
+def _to_array(values: Any) -> Any:
+    """把 list/tuple 转成引擎内部的数组类型（只支持一维，两种后端行为一致）"""
+    if len(values) > MAX_ARRAY_LENGTH:
+        raise ExpressionError(f"数组过长（最多 {MAX_ARRAY_LENGTH} 个元素）")
+    try:
+        array = np.asarray(values, dtype=float) if np is not None else _Series(values)
+    except (TypeError, ValueError) as e:
+        raise ExpressionError(f"数组只能包含数字: {e}") from e
+    # [x, x] 在 numpy 下会变成二维数组，绕过 MAX_ARRAY_LENGTH；纯 Python 后端本来就不支持
+    if np is not None and array.ndim != 1:
+        raise ExpressionError("数组只能是一维数字列表")
+    return array
+
+
+def _check_finite(result: Any) -> None:
+    """inf / nan 不是合法 JSON，统一当作求值失败（纯 Python 下 1e308 * 10 这类溢出不会抛异常）"""
+    if np is not None and isinstance(result, (np.ndarray, np.generic)):
+        finite = bool(np.isfinite(result).all())
+    elif isinstance(result, _Series):
+        finite = all(math.isfinite(v) for v in result.values)
+    elif isinstance(result, float):
+        finite = math.isfinite(result)
+    else:
+        finite = True
+    if not finite:
+        raise ExpressionError("结果溢出或无定义（inf / nan）")
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _check_int_bits(bits: int) -> None:
+    if bits > MAX_INT_BITS:
+        raise ExpressionError(f"结果过大（整数位数需 <= {MAX_INT_BITS} bit）")
+
+
+def _safe_pow(base: Any, exponent: Any) -> Any:
+    """限制指数与结果大小，避免 9**9**9、((10**1000)**1000)**1000 这类表达式把进程卡死
+
+    整数乘方按 exponent * log2(|base|) 估算结果位数；浮点乘方溢出时 Python 会抛 OverflowError。
+    """
+    if _is_array(exponent):
+        if any(abs(x) > MAX_POW_EXPONENT for x in exponent):
+            raise ExpressionError(f"指数过大（绝对值需 <= {MAX_POW_EXPONENT}）")
+    elif abs(exponent) > MAX_POW_EXPONENT:
+        raise ExpressionError(f"指数过大（绝对值需 <= {MAX_POW_EXPONENT}）")
+    elif _is_int(base) and _is_int(exponent) and exponent > 0:
+        _check_int_bits(exponent * max(abs(base).bit_length() - 1, 0))
+    if isinstance(base, _Series):
+        return base ** exponent
+    if isinstance(exponent, _Series):
+        return exponent.__rpow__(base)
+    return base ** exponent
+
+
+def _safe_mul(left: Any, right: Any) -> Any:
+    """大整数相乘前估算结果位数，与乘方共用同一上限"""
+    if _is_int(left) and _is_int(right):
+        _check_int_bits(abs(left).bit_length() + abs(right).bit_length())
+    return left * right
+
+
+def _elementwise(fn: Callable[[float], float], np_fn: Any = None) -> Callable[[Any], Any]:
+    """标量函数提升为逐元素函数（numpy 下直接用对应的 ufunc）"""
+
+    def wrapper(x: Any) -> Any:
+        if np is not None and isinstance(x, np.ndarray):
+            return np_fn(x) if np_fn is not None else np.vectorize(fn)(x)
+        if isinstance(x, _Series):
+            return _Series(fn(v) for v in x.values)
+        return fn(x)
+
+    return wrapper
+
+
+def _values(x: Any) -> list:
+    if not _is_array(x):
+        raise ExpressionError("该函数需要数组参数")
+    return list(x)
+
+
+def _sum(x: Any) -> float:
+    return float(np.sum(x)) if np is not None and isinstance(x, np.ndarray) else math.fsum(_values(x))
+
+
+def _mean(x: Any) -> float:
+    values = _values(x)
+    if not values:
+        raise ExpressionError("空数组无法求平均值")
+    return _sum(x) / len(values)
+
+
+def _reduce_or_pick(builtin: Callable[..., Any], np_reduce: str) -> Callable[..., Any]:
+    """min/max：单个数组参数时做归约，多个标量参数时行为同内置函数"""
+
+    def wrapper(*args: Any) -> Any:
+        if len(args) == 1 and _is_array(args[0]):
+            if np is not None and isinstance(args[0], np.ndarray):
+                return float(getattr(np, np_reduce)(args[0]))
+            return builtin(args[0].values)
+        if any(_is_array(a) for a in args):
+            raise ExpressionError("min/max 不支持数组与标量混用")
+        return builtin(*args)
+
+    return wrapper
+
+
+def _round(x: Any, ndigits: int = 0) -> Any:
+    if np is not None and isinstance(x, np.ndarray):
+        return np.round(x, int(ndigits))
+    if isinstance(x, _Series):
+        return _Series(round(v, int(ndigits)) for v in x.values)
+    return round(x, int(ndigits)) if ndigits else round(x)
+
+
+def _cumsum(x: Any) -> Any:
+    if np is not None and isinstance(x, np.ndarray):
+        return np.cumsum(x)
+    total = 0.0
+    out = []
+    for v in _values(x):
+        total += v
+        out.append(total)
+    return _Series(out)
+
+
+def _diff(x: Any) -> Any:
+    if np is not None and isinstance(x, np.ndarray):
+        return np.diff(x)
+    values = _values(x)
+    return _Series(b - a for a, b in zip(values, values[1:]))
+
+
+def _pct(x: Any) -> Any:
+    """各元素占总和的百分比"""
+    total = _sum(x)
+    if total == 0:
+        raise ExpressionError("数组总和为 0，无法计算百分比")
+    return x / total * 100
+
+
+def _movavg(x: Any, window: Any) -> Any:
+    """简单移动平均（只输出完整窗口，长度为 len(x) - window + 1）"""
+    window = int(window)
+    values = _values(x)
+    if window <= 0 or window > len(values):
+        raise ExpressionError(f"窗口大小需在 1..{len(values)} 之间")
+    if np is not None and isinstance(x, np.ndarray):
+        return np.convolve(x, np.ones(window) / window, mode="valid")
+    out = []
+    acc = math.fsum(values[:window])
+    out.append(acc / window)
+    for i in range(window, len(values)):
+        acc += values[i] - values[i - window]
+        out.append(acc / window)
+    return _Series(out)
+
+
+def _length(x: Any) -> int:
+    return len(_values(x))
+
+
+_FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    "abs": _elementwise(abs, np.abs if np is not None else None),
+    "sqrt": _elementwise(math.sqrt, np.sqrt if np is not None else None),
+    "exp": _elementwise(math.exp, np.exp if np is not None else None),
+    "log": _elementwise(math.log, np.log if np is not None else None),
+    "log10": _elementwise(math.log10, np.log10 if np is not None else None),
+    "sin": _elementwise(math.sin, np.sin if np is not None else None),
+    "cos": _elementwise(math.cos, np.cos if np is not None else None),
+    "tan": _elementwise(math.tan, np.tan if np is not None else None),
+    "floor": _elementwise(math.floor, np.floor if np is not None else None),
+    "ceil": _elementwise(math.ceil, np.ceil if np is not None else None),
+    "round": _round,
+    "min": _reduce_or_pick(min, "min"),
+    "max": _reduce_or_pick(max, "max"),
+    "sum": _sum,
+    "mean": _mean,
+    "len": _length,
+    "cumsum": _cumsum,
+    "diff": _diff,
+    "pct": _pct,
+    "movavg": _movavg,
+}
+
+_CONSTANTS: Dict[str, float] = {"pi": math.pi, "e": math.e}
+
+
+class _Validator(ast.NodeVisitor):
+    """只放行白名单里的语法节点，收集表达式引用到的变量名"""
+
+    def __init__(self):
+        self.names: set[str] = set()
+
+    def generic_visit(self, node: ast.AST) -> None:
+        raise ExpressionError(f"不支持的语法: {type(node).__name__}")
+
+    def visit_Expression(self, node: ast.Expression) -> None:
+        self.visit(node.body)
+
+    def visit_Constant(self, node: ast.Constant) -> None:
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ExpressionError(f"只支持数字常量: {node.value!r}")
+
+    def visit_Name(self, node: ast.Name) -> None:
+        if node.id.startswith("_"):
+            raise ExpressionError(f"非法标识符: {node.id}")
+        if node.id in _FUNCTIONS:
+            raise ExpressionError(f"函数 {node.id} 必须被调用")
+        if node.id not in _CONSTANTS:
+            self.names.add(node.id)
+
+    def visit_BinOp(self, node: ast.BinOp) -> None:
+        if not isinstance(node.op, _ALLOWED_BINOPS):
+            raise ExpressionError(f"不支持的运算符: {type(node.op).__name__}")
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> None:
+        if not isinstance(node.op, _ALLOWED_UNARYOPS):
+            raise ExpressionError(f"不支持的运算符: {type(node.op).__name__}")
+        self.visit(node.operand)
+
+    def visit_Call(self, node: ast.Call) -> None:
+        if not isinstance(node.func, ast.Name) or node.func.id not in _FUNCTIONS:
+            raise ExpressionError("只允许调用白名单内的数学函数: " + ", ".join(sorted(_FUNCTIONS)))
+        if node.keywords:
+            raise ExpressionError("函数调用不支持关键字参数")
+        for arg in node.args:
+            self.visit(arg)
+
+    def visit_List(self, node: ast.List) -> None:
+        for elt in node.elts:
+            self.visit(elt)
+
+    visit_Tuple = visit_List
+
+
+class _Rewriter(ast.NodeTransformer):
+    """把 ** / * 改写成 _pow(...) / _mul(...)，把列表字面量改写成 _array([...])"""
+
+    _GUARDED_OPS = {ast.Pow: "_pow", ast.Mult: "_mul"}
+
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        self.generic_visit(node)
+        guard = self._GUARDED_OPS.get(type(node.op))
+        if guard is not None:
+            return ast.Call(
+                func=ast.Name(id=guard, ctx=ast.Load()),
+                args=[node.left, node.right],
+                keywords=[],
+            )
+        return node
+
+    def visit_List(self, node: ast.List) -> ast.AST:
+        self.generic_visit(node)
+        return ast.Call(func=ast.Name(id="_array", ctx=ast.Load()), args=[node], keywords=[])
+
+    visit_Tuple = visit_List
+
+
+class CompiledExpression:
+    """编译好的表达式：code 对象 + 引用到的变量名"""
+
+    __slots__ = ("source", "code", "names")
+
+    def __init__(self, source: str, code: Any, names: frozenset[str]):
+        self.source = source
+        self.code = code
+        self.names = names
+
+    def evaluate(self, variables: Dict[str, Any] | None = None) -> Any:
+        namespace: Dict[str, Any] = {**_FUNCTIONS, **_CONSTANTS, "_pow": _safe_pow, "_mul": _safe_mul, "_array": _to_array}
+        variables = variables or {}
+        missing = self.names - variables.keys()
+        if missing:
+            raise ExpressionError(f"未定义的变量: {', '.join(sorted(missing))}")
+        for name in self.names:
+            value = variables[name]
+            if isinstance(value, (list, tuple)):
+                value = _to_array(value)
+            elif isinstance(value, bool) or not isinstance(value, (int, float)) and not _is_array(value):
+                raise ExpressionError(f"变量 {name} 必须是数字或数字数组")
+            namespace[name] = value
+        try:
+            if np is not None:
+                # numpy 默认对除零/溢出/定义域错误只给 warning 并返回 inf/nan，这里改为抛异常，
+                # 与纯 Python 后端一致；下溢（exp(-1000) -> 0.0）两种后端都不报错
+                with np.errstate(all="raise", under="ignore"):
+                    result = eval(self.code, {"__builtins__": {}}, namespace)
+            else:
+                result = eval(self.code, {"__builtins__": {}}, namespace)
+        except ExpressionError:
+            raise
+        except (ArithmeticError, ValueError, TypeError) as e:
+            raise ExpressionError(str(e)) from e
+        except RecursionError as e:
+            raise ExpressionError("表达式嵌套过深") from e
+        _check_finite(result)
+        return result
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_expression(expression: str) -> CompiledExpression:
+    """解析 + 校验 + 编译表达式（LRU 缓存，同一表达式只编译一次）"""
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"表达式过长（最多 {MAX_EXPRESSION_LENGTH} 个字符）")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+        validator = _Validator()
+        validator.visit(tree)
+        tree = ast.fix_missing_locations(_Rewriter().visit(tree))
+        code = compile(tree, "<calculator>", "eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"语法错误: {e.msg}") from e
+    except RecursionError as e:
+        # "-" * 999 + "1" 这类深度嵌套的一元运算会让 AST 遍历/编译递归溢出
+        raise ExpressionError("表达式嵌套过深") from e
+    return CompiledExpression(expression, code, frozenset(validator.names))
+
+
+def evaluate(expression: str, variables: Dict[str, Any] | None = None) -> Any:
+    """求值表达式，数组结果以 list 返回，标量结果以 int/float 返回"""
+    result = compile_expression(expression).evaluate(variables)
+    if np is not None and isinstance(result, np.ndarray):
+        return result.tolist()
+    if np is not None and isinstance(result, np.generic):
+        return result.item()
+    if isinstance(result, _Series):
+        return result.values
+    return result
+
+
+def benchmark(size: int = 10_000, repeat: int = 5) -> Dict[str, float]:
+    """对比“一次向量化求值整条序列”与“逐元素调用 evaluate”的吞吐"""
+    series = [float(i % 97) for i in range(size)]
+    expression = "x * 1.08 + sqrt(x)"
+
+    vectorized = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        evaluate(expression, {"x": series})
+        vectorized = min(vectorized, time.perf_counter() - start)
+
+    per_element = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for value in series:
+            evaluate(expression, {"x": value})
+        per_element = min(per_element, time.perf_counter() - start)
+
+    return {
+        "size": size,
+        "backend": "numpy" if np is not None else "python",
+        "vectorized_s": vectorized,
+        "per_element_s": per_element,
+        "vectorized_items_per_s": size / vectorized,
+        "per_element_items_per_s": size / per_element,
+        "speedup": per_element / vectorized,
+    }
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(benchmark(), indent=2))
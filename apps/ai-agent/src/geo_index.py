@@ -0,0 +1,116 @@
+"""离线城市地理编码索引：供 get_weather 工具把城市名解析成经纬度。
+
+城市表随代码一起打包，每行一个城市：标准名|别名(英文/拼音/简称)|纬度|经度。
+模块导入时一次性构建「归一化别名 -> 城市」的查找表，之后每次解析都是 O(1) 字典查询，
+不需要再请求在线 geocoding 服务。
+"""
+
+from typing import NamedTuple
+
+# 标准名|别名（逗号分隔）|纬度|经度
+_CITY_TABLE = """
+北京|beijing,peking,京|39.9042|116.4074
+上海|shanghai,沪|31.2304|121.4737
+广州|guangzhou,canton,穗|23.1291|113.2644
+深圳|shenzhen|22.5431|114.0579
+杭州|hangzhou|30.2741|120.1551
+成都|chengdu,蓉|30.5728|104.0668
+重庆|chongqing,chungking,渝|29.5630|106.5516
+天津|tianjin,津|39.3434|117.3616
+南京|nanjing,nanking|32.0603|118.7969
+武汉|wuhan|30.5928|114.3055
+西安|xian,xi'an,长安|34.3416|108.9398
+苏州|suzhou|31.2990|120.5853
+郑州|zhengzhou|34.7466|113.6254
+长沙|changsha|28.2282|112.9388
+青岛|qingdao,tsingtao|36.0671|120.3826
+沈阳|shenyang|41.8057|123.4315
+大连|dalian|38.9140|121.6147
+厦门|xiamen,amoy|24.4798|118.0894
+福州|fuzhou|26.0745|119.2965
+济南|jinan|36.6512|117.1201
+合肥|hefei|31.8206|117.2272
+昆明|kunming|25.0389|102.7183
+南宁|nanning|22.8170|108.3665
+贵阳|guiyang|26.6470|106.6302
+南昌|nanchang|28.6820|115.8579
+哈尔滨|haerbin,harbin|45.8038|126.5350
+长春|changchun|43.8171|125.3235
+石家庄|shijiazhuang|38.0428|114.5149
+太原|taiyuan|37.8706|112.5489
+兰州|lanzhou|36.0611|103.8343
+乌鲁木齐|wulumuqi,urumqi|43.8256|87.6168
+拉萨|lasa,lhasa|29.6520|91.1721
+呼和浩特|huhehaote,hohhot|40.8426|111.7492
+海口|haikou|20.0440|110.1999
+三亚|sanya|18.2528|109.5119
+宁波|ningbo|29.8683|121.5440
+无锡|wuxi|31.4912|120.3119
+珠海|zhuhai|22.2710|113.5767
+东莞|dongguan|23.0207|113.7518
+佛山|foshan|23.0215|113.1214
+香港|xianggang,hong kong,hongkong,hk|22.3193|114.1694
+澳门|aomen,macau,macao|22.1987|113.5439
+台北|taibei,taipei|25.0330|121.5654
+伦敦|london|51.5074|-0.1278
+纽约|new york,newyork,nyc|40.7128|-74.0060
+东京|tokyo,dongjing|35.6762|139.6503
+巴黎|paris|48.8566|2.3522
+首尔|seoul,shouer,汉城|37.5665|126.9780
+新加坡|singapore,xinjiapo|1.3521|103.8198
+曼谷|bangkok,mangu|13.7563|100.5018
+悉尼|sydney,xini|-33.8688|151.2093
+墨尔本|melbourne|-37.8136|144.9631
+洛杉矶|los angeles,la|34.0522|-118.2437
+旧金山|san francisco,sf,三藩市|37.7749|-122.4194
+芝加哥|chicago|41.8781|-87.6298
+西雅图|seattle|47.6062|-122.3321
+多伦多|toronto|43.6532|-79.3832
+温哥华|vancouver|49.2827|-123.1207
+柏林|berlin|52.5200|13.4050
+莫斯科|moscow|55.7558|37.6173
+罗马|rome|41.9028|12.4964
+马德里|madrid|40.4168|-3.7038
+阿姆斯特丹|amsterdam|52.3676|4.9041
+迪拜|dubai|25.2048|55.2708
+大阪|osaka|34.6937|135.5023
+""".strip()
+
+
+class City(NamedTuple):
+    name: str
+    latitude: float
+    longitude: float
+
+
+def _normalize(name: str) -> str:
+    """归一化：小写、去空白/连字符/撇号，去掉「市」后缀"""
+    key = name.strip().lower()
+    for ch in (" ", "-", "_", "'", "’", "."):
+        key = key.replace(ch, "")
+    if key.endswith("市") and len(key) > 2:
+        key = key[:-1]
+    return key
+
+
+def _build_index(table: str) -> dict[str, City]:
+    index: dict[str, City] = {}
+    for line in table.splitlines():
+        name, aliases, lat, lon = line.split("|")
+        city = City(name, float(lat), float(lon))
+        for alias in [name, *aliases.split(",")]:
+            index.setdefault(_normalize(alias), city)
+    return index
+
+
+_INDEX = _build_index(_CITY_TABLE)
+
+
+def resolve_city(name: str) -> City | None:
+    """把城市名（中文/英文/拼音/简称）解析为 City，未收录返回 None"""
+    return _INDEX.get(_normalize(name))
+
+
+def supported_cities() -> list[str]:
+    """所有收录城市的标准名（去重，保持表内顺序）"""
+    return list(dict.fromkeys(city.name for city in _INDEX.values()))
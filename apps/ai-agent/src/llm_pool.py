@@ -0,0 +1,274 @@
+"""进程级共享的 LLM 连接池 + 首 token 对冲请求（hedged request）。
+
+- get_async_http_client(): 同一事件循环共享一个 keep-alive 的 httpx.AsyncClient，
+  装了 h2 时启用 HTTP/2，连接不再随每次请求新建的 ChatOpenAI 一起丢弃
+- get_chat_model(): 复用同一个 ChatOpenAI（配置来自环境变量）
+- ainvoke_hedged(): 若在 LLM_HEDGE_AFTER_SECONDS 内没收到首个 token，再发一个相同请求，
+  谁先出首 token 用谁，另一个取消；对冲时各请求的回调事件先暂存，只有胜出的那个会进入
+  astream_events，客户端不会收到落败请求的 start / chunk
+
+本地调试时把 OPENAI_BASE_URL 指向任意 OpenAI 兼容的 stub 服务即可。
+"""
+
+import asyncio
+import importlib.util
+import inspect
+import os
+import weakref
+from typing import Any, Callable
+
+import httpx
+from langchain_core.callbacks import BaseCallbackManager
+from langchain_core.messages import BaseMessage, message_chunk_to_message
+from langchain_core.runnables.config import var_child_runnable_config
+from langchain_core.tracers.langchain import LangChainTracer
+from langchain_openai import ChatOpenAI
+
+# 每个事件循环一份：httpx.AsyncClient 不能跨事件循环使用
+_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_chat_models: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ChatOpenAI]" = weakref.WeakKeyDictionary()
+
+
+def _env_float(name: str, default: float | None) -> float | None:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        print(f"⚠️  Warning: invalid {name}={value!r}, using {default}")
+        return default
+
+
+def http2_enabled() -> bool:
+    """LLM_HTTP2=0 可关闭；未安装 h2 时自动回退 HTTP/1.1"""
+    if os.getenv("LLM_HTTP2", "1").lower() in ("0", "false", "no"):
+        return False
+    return importlib.util.find_spec("h2") is not None
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """当前事件循环共享的 keep-alive 连接池（必须在事件循环内调用）"""
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=http2_enabled(),
+            limits=httpx.Limits(
+                max_connections=int(_env_float("LLM_MAX_CONNECTIONS", 100)),
+                max_keepalive_connections=int(_env_float("LLM_MAX_KEEPALIVE", 20)),
+                keepalive_expiry=_env_float("LLM_KEEPALIVE_EXPIRY", 60.0),
+            ),
+            timeout=httpx.Timeout(_env_float("LLM_TIMEOUT", 120.0), connect=10.0),
+        )
+        _http_clients[loop] = client
+    return client
+
+
+def get_chat_model() -> ChatOpenAI:
+    """当前事件循环共享的 ChatOpenAI（底层使用共享连接池）"""
+    loop = asyncio.get_running_loop()
+    model = _chat_models.get(loop)
+    if model is None or model.http_async_client is not get_async_http_client():
+        model = ChatOpenAI(
+            model=os.getenv("MODEL_NAME", "claude-sonnet-4-5-20250929"),
+            base_url=os.getenv("OPENAI_BASE_URL"),
+            api_key=os.getenv("OPENAI_API_KEY"),
+            temperature=0.7,
+            streaming=True,
+            http_async_client=get_async_http_client(),
+        )
+        _chat_models[loop] = model
+    return model
+
+
+async def aclose_http_clients() -> None:
+    """关闭当前事件循环的连接池（应用 shutdown 时调用）"""
+    loop = asyncio.get_running_loop()
+    _chat_models.pop(loop, None)
+    client = _http_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+def hedge_after_seconds() -> float | None:
+    """LLM_HEDGE_AFTER_SECONDS 未设置或 <= 0 时不对冲"""
+    value = _env_float("LLM_HEDGE_AFTER_SECONDS", None)
+    return value if value and value > 0 else None
+
+
+class _CallbackGate:
+    """一次对冲请求的回调闸门：胜出前暂存回调事件，release() 后按原顺序补发并直通"""
+
+    def __init__(self):
+        self.released = False
+        self._held: list[tuple[Any, str, tuple, dict]] = []
+
+    async def dispatch(self, handler: Any, name: str, args: tuple, kwargs: dict) -> None:
+        if self.released:
+            await _call_handler(handler, name, args, kwargs)
+        else:
+            self._held.append((handler, name, args, kwargs))
+
+    async def release(self) -> None:
+        self.released = True
+        held, self._held = self._held, []
+        for handler, name, args, kwargs in held:
+            await _call_handler(handler, name, args, kwargs)
+
+
+async def _call_handler(handler: Any, name: str, args: tuple, kwargs: dict) -> None:
+    try:
+        result = getattr(handler, name)(*args, **kwargs)
+        if inspect.isawaitable(result):
+            await result
+    except NotImplementedError:
+        pass
+    except Exception as e:
+        if getattr(handler, "raise_error", False):
+            raise
+        print(f"⚠️  Warning: error in {type(handler).__name__}.{name} callback: {e!r}")
+
+
+class _GatedHandler:
+    """包一层回调 handler：on_* 事件交给闸门，其余属性（ignore_*、raise_error 等）透传"""
+
+    def __init__(self, handler: Any, gate: _CallbackGate):
+        self._handler = handler
+        self._gate = gate
+
+    def __getattr__(self, name: str) -> Any:
+        if not name.startswith("on_"):
+            return getattr(self._handler, name)
+
+        async def handle(*args: Any, **kwargs: Any) -> None:
+            await self._gate.dispatch(self._handler, name, args, kwargs)
+
+        return handle
+
+
+def _gated_config(config: Any, gate: _CallbackGate) -> dict:
+    """复制 config，把其中的回调 handler 换成经过闸门的版本（LangSmith tracer 除外，两次请求都照常记录）"""
+    config = dict(config or {})
+    callbacks = config.get("callbacks")
+    if not callbacks:
+        return config
+
+    wrapped: dict[int, Any] = {}
+
+    def wrap(handler: Any) -> Any:
+        if isinstance(handler, LangChainTracer):
+            return handler
+        return wrapped.setdefault(id(handler), _GatedHandler(handler, gate))
+
+    if isinstance(callbacks, BaseCallbackManager):
+        manager = callbacks.copy()
+        manager.handlers = [wrap(h) for h in callbacks.handlers]
+        manager.inheritable_handlers = [wrap(h) for h in callbacks.inheritable_handlers]
+        config["callbacks"] = manager
+    else:
+        config["callbacks"] = [wrap(h) for h in callbacks]
+    return config
+
+
+async def _open_stream(model: Any, messages: list, config: Any) -> tuple[Any, Any]:
+    """发起流式请求并等到首个 chunk，返回 (迭代器, 首个 chunk)"""
+    stream = model.astream(messages, config=config).__aiter__()
+    first = await stream.__anext__()
+    return stream, first
+
+
+async def _open_gated_stream(model: Any, messages: list, config: dict) -> tuple[Any, Any]:
+    """在独立 task 内把上下文里的父 config 也换成带闸门的版本，
+    否则 bind_tools 等 RunnableBinding 合并 config 时会把原始 handler 重新并进来"""
+    var_child_runnable_config.set(config)
+    return await _open_stream(model, messages, config)
+
+
+async def _discard(task: asyncio.Task) -> None:
+    """取消落败的请求；若它已经拿到首 chunk，关闭其流以释放连接"""
+    if not task.done():
+        task.cancel()
+        try:
+            await task
+        except BaseException:
+            pass
+        return
+    if task.cancelled() or task.exception() is not None:
+        return
+    stream, _ = task.result()
+    if hasattr(stream, "aclose"):
+        await stream.aclose()
+
+
+async def ainvoke_hedged(
+    model: Any,
+    messages: list,
+    hedge_after: float | None = None,
+    config: Any = None,
+    on_chunk: Callable[[Any], None] | None = None,
+) -> BaseMessage:
+    """带首 token 对冲的调用
+
+    hedge_after 为 None 时不对冲；否则先发主请求，
+    超过 hedge_after 秒仍无首个 chunk 时再发一个备份请求，保留先出首 chunk 的那个。
+    对冲时每个请求使用带闸门的 config：回调事件（on_chat_model_start、首个 chunk 等）先暂存，
+    胜出后才补发给 config 里的 handler，落败请求的事件直接丢弃，astream_events 只看到一次模型调用。
+
+    on_chunk 会收到最终采用的那条流的每个 chunk（用于推测执行等）。
+    既不对冲也不需要 on_chunk 时等价于 model.ainvoke。
+    """
+    if hedge_after is None and on_chunk is None:
+        return await model.ainvoke(messages, config=config)
+
+    if hedge_after is None:
+        return await _consume(*await _open_stream(model, messages, config), on_chunk)
+
+    gates: dict[asyncio.Task, _CallbackGate] = {}
+
+    def start_attempt() -> asyncio.Task:
+        gate = _CallbackGate()
+        task = asyncio.create_task(_open_gated_stream(model, messages, _gated_config(config, gate)))
+        gates[task] = gate
+        return task
+
+    tasks = [start_attempt()]
+    winner: asyncio.Task | None = None
+    failed: list[asyncio.Task] = []
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if not done:
+            print(f"⏱️  No first token after {hedge_after}s, sending hedged request")
+            tasks.append(start_attempt())
+
+        pending = set(tasks)
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=tasks.index):
+                if task.exception() is None:
+                    winner = task
+                    break
+                failed.append(task)
+    finally:
+        for task in tasks:
+            if task is not winner:
+                await _discard(task)
+
+    if winner is None:
+        # 全部失败：补发最先失败的请求的回调（含 on_llm_error），再抛出它的异常
+        await gates[failed[0]].release()
+        raise failed[0].exception()
+
+    await gates[winner].release()
+    return await _consume(*winner.result(), on_chunk)
+
+
+async def _consume(stream: Any, full: Any, on_chunk: Callable[[Any], None] | None) -> BaseMessage:
+    """读完已拿到首 chunk 的流，合并为完整消息"""
+    if on_chunk is not None:
+        on_chunk(full)
+    async for chunk in stream:
+        if on_chunk is not None:
+            on_chunk(chunk)
+        full = full + chunk
+    return message_chunk_to_message(full)
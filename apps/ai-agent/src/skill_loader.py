@@ -1,7 +1,315 @@
 import os
+import re
+import threading
 import yaml
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
 
+FRONTMATTER_REGEX = re.compile(r'^---\s*\n([\s\S]*?)\n---\s*\n([\s\S]*)$')
+# 技能正文按二级标题切分为可单独注入的 section
+SECTION_HEADING_REGEX = re.compile(r'^##\s+(.+?)\s*#*\s*$')
+CODE_FENCE_REGEX = re.compile(r'^\s*(```|~~~)')
+TOKEN_REGEX = re.compile(r'[a-z0-9]+|[一-鿿]+')
+
+SKILL_FILE_NAMES = ['SKILL.md', 'skill.md', 'README.md']
+
+# 匹配时忽略的英文高频词
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from", "how",
+    "i", "in", "is", "it", "me", "my", "of", "on", "or", "please", "the", "this", "to",
+    "use", "used", "what", "when", "with", "you", "your",
+})
+
+
+# 中文词 -> 英文词：让中文请求也能命中英文标题的 section（如「表单」->「Forms」）
+CJK_SYNONYMS = {
+    "界面": "ui", "展示": "display", "显示": "display", "可视化": "visualization",
+    "仪表盘": "dashboard", "看板": "dashboard", "卡片": "card", "图表": "chart",
+    "表格": "table", "列表": "list", "表单": "form", "登录": "form", "注册": "form",
+    "按钮": "button", "输入框": "input", "复选框": "checkbox", "下拉": "select",
+    "标签页": "tabs", "弹窗": "dialog", "对话框": "dialog", "组件": "component",
+    "布局": "layout", "图标": "icon", "文本": "text", "天气": "weather",
+    "气温": "weather", "温度": "weather", "预报": "weather",
+}
+
+# 没有在 frontmatter 里声明 keywords / core_sections 时使用的内置默认值
+DEFAULT_SKILL_META = {
+    "a2ui": {
+        "keywords": [
+            "ui", "interface", "display", "show", "visual", "visualize", "dashboard", "card",
+            "chart", "graph", "plot", "table", "list", "form", "login", "signup", "button",
+            "input", "checkbox", "select", "dropdown", "tab", "dialog", "modal", "component",
+            "widget", "layout", "render", "page", "screen", "weather", "forecast", "temperature",
+            *CJK_SYNONYMS.keys(), "天气怎么样", "页面", "渲染", "画一个", "做一个",
+        ],
+        "core_sections": ["protocol", "format"],
+    },
+}
+
+
+def stem(word: str) -> str:
+    """极简英文词干：去掉常见的复数 / 时态后缀（forms -> form, charts -> chart）"""
+    for suffix, replacement in (("ies", "y"), ("ing", ""), ("ed", ""), ("es", ""), ("s", "")):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            if suffix == "es" and not word.endswith(("shes", "ches", "xes", "sses")):
+                continue
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+def tokenize(text: str) -> set[str]:
+    """切词：英文按单词（去停用词、取词干），中文按相邻二字组（单字串保留单字），
+    并把 CJK_SYNONYMS 中出现的中文词映射为英文词"""
+    lowered = text.lower()
+    tokens: set[str] = set()
+    for run in TOKEN_REGEX.findall(lowered):
+        if run[0].isascii():
+            if len(run) > 1 and run not in STOPWORDS:
+                tokens.add(stem(run))
+        elif len(run) == 1:
+            tokens.add(run)
+        else:
+            tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.update(english for cjk, english in CJK_SYNONYMS.items() if cjk in lowered)
+    return tokens
+
+
+def keyword_matches(keyword: str, query: str, query_tokens: set[str]) -> bool:
+    """英文关键词按词干整词匹配（多词关键词需全部出现），中文关键词按子串匹配"""
+    keyword = keyword.strip().lower()
+    if not keyword:
+        return False
+    if keyword.isascii():
+        keyword_tokens = {stem(t) for t in TOKEN_REGEX.findall(keyword)}
+        return bool(keyword_tokens) and keyword_tokens <= query_tokens
+    return keyword in query.lower()
+
+
+@dataclass
+class SkillSection:
+    title: str  # 前言部分（第一个 ## 之前）标题为空字符串
+    content: str
+    tokens: set[str] = field(default_factory=set)
+
+
+@dataclass
+class SkillEntry:
+    name: str
+    base_dir: Path
+    file_path: Path
+    mtime_ns: int
+    frontmatter: dict
+    body: str
+    sections: list[SkillSection]
+    # 来自 name / description 的匹配词（仅在未声明 keywords 时用于挑选 skill）
+    tokens: set[str] = field(default_factory=set)
+    # 意图关键词：frontmatter keywords，缺省时取 DEFAULT_SKILL_META
+    keywords: list[str] = field(default_factory=list)
+    # 选中该 skill 时始终注入的 section（按标题子串匹配，忽略大小写）
+    core_sections: list[str] = field(default_factory=list)
+
+    @property
+    def description(self) -> str:
+        return self.frontmatter.get("description", "")
+
+    def matches(self, query: str, query_tokens: set[str]) -> bool:
+        if self.keywords:
+            return any(keyword_matches(k, query, query_tokens) for k in self.keywords)
+        return bool(self.tokens & query_tokens)
+
+    def is_core(self, section: SkillSection) -> bool:
+        title = section.title.lower()
+        return not title or any(core.lower() in title for core in self.core_sections)
+
+
+class SkillRegistry:
+    """扫描 skills 目录并缓存解析结果
+
+    目录只在自身或某个 skill 子目录的 mtime 变化时重新扫描（在已有子目录里新增 SKILL.md
+    只会改变子目录的 mtime）；单个 skill 文件按 mtime 失效、重新解析，
+    其余情况直接复用缓存，不再每次读文件 + 正则解析 frontmatter。
+    """
+
+    def __init__(self, skills_dir: Path):
+        self.skills_dir = Path(skills_dir)
+        self._entries: dict[str, SkillEntry] = {}
+        self._dir_signature: tuple | None = None
+        self._lock = threading.Lock()
+
+    def skills(self) -> dict[str, SkillEntry]:
+        """返回当前所有 skill（按需刷新缓存）"""
+        with self._lock:
+            self._refresh()
+            return dict(self._entries)
+
+    def get(self, skill_name: str) -> SkillEntry | None:
+        return self.skills().get(skill_name)
+
+    def select(self, query: str, max_sections: int | None = None) -> list[tuple[SkillEntry, list[SkillSection]]]:
+        """为一次请求挑选相关的 skill 及其 section
+
+        - skill 是否相关只看意图关键词（frontmatter keywords，中英文均可）；
+          未声明 keywords 时退回 name/description 词重合。section 正文命中不会单独拉入 skill
+        - 相关 skill 中保留前言 + core_sections + 命中的 section（按命中词数排序，最多 max_sections 个）；
+          没有具体 section 命中时保留全部 section，宁多勿少
+        """
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return []
+
+        selected = []
+        for entry in self.skills().values():
+            if not entry.matches(query, query_tokens):
+                continue
+
+            scored = [
+                (len(section.tokens & query_tokens), index, section)
+                for index, section in enumerate(entry.sections)
+                if not entry.is_core(section)
+            ]
+            hits = sorted((item for item in scored if item[0] > 0), key=lambda item: (-item[0], item[1]))
+            if hits:
+                if max_sections is not None:
+                    hits = hits[:max_sections]
+                keep = {index for _, index, _ in hits}
+                sections = [s for i, s in enumerate(entry.sections) if entry.is_core(s) or i in keep]
+            else:
+                sections = list(entry.sections)
+            selected.append((sum(score for score, _, _ in hits), entry, sections))
+
+        selected.sort(key=lambda item: -item[0])
+        return [(entry, sections) for _, entry, sections in selected]
+
+    def _signature(self) -> tuple:
+        """skills 目录及其子目录的 mtime（子目录数量很少，每次 stat 一遍的开销可以忽略）"""
+        children = []
+        for child in self.skills_dir.iterdir():
+            try:
+                if child.is_dir():
+                    children.append((child.name, child.stat().st_mtime_ns))
+            except FileNotFoundError:
+                continue
+        return self.skills_dir.stat().st_mtime_ns, tuple(sorted(children))
+
+    def _refresh(self) -> None:
+        try:
+            signature = self._signature()
+        except FileNotFoundError:
+            self._entries = {}
+            self._dir_signature = None
+            return
+
+        if signature != self._dir_signature:
+            # 目录内容有变化（增删 skill），重新扫描
+            found: dict[str, Path] = {}
+            for child in sorted(self.skills_dir.iterdir()):
+                if not child.is_dir():
+                    continue
+                for file_name in SKILL_FILE_NAMES:
+                    if (child / file_name).exists():
+                        found[child.name] = child / file_name
+                        break
+            self._entries = {
+                name: entry for name, entry in self._entries.items()
+                if found.get(name) == entry.file_path
+            }
+            for name, file_path in found.items():
+                if name not in self._entries:
+                    self._load(name, file_path)
+            self._dir_signature = signature
+
+        for name, entry in list(self._entries.items()):
+            try:
+                mtime_ns = entry.file_path.stat().st_mtime_ns
+            except FileNotFoundError:
+                del self._entries[name]
+                self._dir_signature = None
+                continue
+            if mtime_ns != entry.mtime_ns:
+                self._load(name, entry.file_path)
+
+    def _load(self, name: str, file_path: Path) -> None:
+        mtime_ns = file_path.stat().st_mtime_ns
+        with open(file_path, 'r', encoding='utf-8') as f:
+            raw_content = f.read()
+
+        frontmatter, body = parse_frontmatter(raw_content)
+        defaults = DEFAULT_SKILL_META.get(name, {})
+        keywords = _as_list(frontmatter.get("keywords")) or defaults.get("keywords", [])
+        core_sections = _as_list(frontmatter.get("core_sections")) or defaults.get("core_sections", [])
+
+        self._entries[name] = SkillEntry(
+            name=frontmatter.get("name", name),
+            base_dir=file_path.parent,
+            file_path=file_path,
+            mtime_ns=mtime_ns,
+            frontmatter=frontmatter,
+            body=body,
+            sections=split_sections(body),
+            tokens=tokenize(f"{name} {frontmatter.get('description', '')}"),
+            keywords=keywords,
+            core_sections=core_sections,
+        )
+
+
+def _as_list(value) -> list[str]:
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [str(v) for v in value]
+
+
+def parse_frontmatter(content: str) -> tuple[dict, str]:
+    """解析 YAML frontmatter"""
+    match = FRONTMATTER_REGEX.match(content)
+
+    if match:
+        frontmatter_yaml = match.group(1)
+        main_content = match.group(2)
+
+        try:
+            frontmatter = yaml.safe_load(frontmatter_yaml)
+            return frontmatter or {}, main_content
+        except Exception:
+            return {}, content
+
+    return {}, content
+
+
+def split_sections(body: str) -> list[SkillSection]:
+    """按 ## 标题切分正文（忽略代码块内的 #），第一个标题之前的内容作为前言"""
+    sections: list[SkillSection] = []
+    title = ""
+    lines: list[str] = []
+    in_fence = False
+
+    def flush():
+        content = "\n".join(lines).strip("\n")
+        if content.strip() or title:
+            sections.append(SkillSection(title, content, tokenize(f"{title}\n{content}")))
+
+    for line in body.splitlines():
+        if CODE_FENCE_REGEX.match(line):
+            in_fence = not in_fence
+        heading = None if in_fence else SECTION_HEADING_REGEX.match(line)
+        if heading:
+            flush()
+            title = heading.group(1)
+            lines = [line]
+        else:
+            lines.append(line)
+    flush()
+    return sections
+
+
+@lru_cache(maxsize=None)
+def get_skill_registry(skills_dir: Path) -> SkillRegistry:
+    """同一目录在进程内共享一个 registry"""
+    return SkillRegistry(skills_dir)
+
+
 class SkillLoader:
     def __init__(self, skills_dir=None):
         """初始化 Skill Loader"""
@@ -11,14 +319,16 @@ class SkillLoader:
             skills_dir = project_root / ".claude" / "skills"
 
         self.skills_dir = Path(skills_dir)
+        self.registry = get_skill_registry(self.skills_dir.resolve())
 
-    def load_skill(self, skill_name: str, args: str = "") -> dict:
+    def load_skill(self, skill_name: str, args: str = "", sections: list[SkillSection] | None = None) -> dict:
         """
         加载一个 skill
 
         Args:
             skill_name: skill 名称，如 'a2ui'
             args: 传递给 skill 的参数（可选）
+            sections: 只注入这些 section（可选，默认注入完整正文）
 
         Returns:
             {
@@ -31,47 +341,14 @@ class SkillLoader:
             }
         """
         try:
-            # 1. 定位 skill 目录
-            skill_base_dir = self.skills_dir / skill_name
-
-            if not skill_base_dir.exists():
-                raise FileNotFoundError(f"Skill directory not found: {skill_base_dir}")
-
-            # 2. 查找 SKILL.md 文件
-            possible_files = ['SKILL.md', 'skill.md', 'README.md']
-            skill_file_path = None
-
-            for file_name in possible_files:
-                test_path = skill_base_dir / file_name
-                if test_path.exists():
-                    skill_file_path = test_path
-                    break
+            if not (self.skills_dir / skill_name).exists():
+                raise FileNotFoundError(f"Skill directory not found: {self.skills_dir / skill_name}")
 
-            if not skill_file_path:
-                raise FileNotFoundError(f"Skill file not found in {skill_base_dir}")
+            entry = self.registry.get(skill_name)
+            if entry is None:
+                raise FileNotFoundError(f"Skill file not found in {self.skills_dir / skill_name}")
 
-            # 3. 读取文件内容
-            with open(skill_file_path, 'r', encoding='utf-8') as f:
-                raw_content = f.read()
-
-            # 4. 解析 frontmatter
-            frontmatter, content = self._parse_frontmatter(raw_content)
-
-            # 5. 构建完整的 skill 上下文
-            skill_context = self._build_skill_context(
-                str(skill_base_dir),
-                content,
-                args
-            )
-
-            return {
-                "success": True,
-                "name": frontmatter.get("name", skill_name),
-                "description": frontmatter.get("description", ""),
-                "content": skill_context,
-                "base_dir": str(skill_base_dir),
-                "frontmatter": frontmatter
-            }
+            return self._to_result(entry, args, sections)
 
         except Exception as e:
             return {
@@ -79,24 +356,36 @@ class SkillLoader:
                 "error": str(e)
             }
 
-    def _parse_frontmatter(self, content: str) -> tuple[dict, str]:
-        """解析 YAML frontmatter"""
-        import re
-
-        frontmatter_regex = r'^---\s*\n([\s\S]*?)\n---\s*\n([\s\S]*)$'
-        match = re.match(frontmatter_regex, content)
+    def select_skills(self, query: str, max_sections: int | None = None) -> list[dict]:
+        """按请求内容挑选相关 skill，返回与 load_skill 相同结构的结果列表"""
+        try:
+            return [
+                self._to_result(entry, "", sections)
+                for entry, sections in self.registry.select(query, max_sections)
+            ]
+        except Exception as e:
+            print(f"⚠️  Warning: Failed to select skills: {e}")
+            return []
 
-        if match:
-            frontmatter_yaml = match.group(1)
-            main_content = match.group(2)
+    def _to_result(self, entry: SkillEntry, args: str, sections: list[SkillSection] | None) -> dict:
+        if sections is None:
+            content = entry.body
+        else:
+            content = "\n\n".join(section.content for section in sections)
 
-            try:
-                frontmatter = yaml.safe_load(frontmatter_yaml)
-                return frontmatter or {}, main_content
-            except Exception:
-                return {}, content
+        return {
+            "success": True,
+            "name": entry.name,
+            "description": entry.description,
+            "content": self._build_skill_context(str(entry.base_dir), content, args),
+            "base_dir": str(entry.base_dir),
+            "frontmatter": entry.frontmatter,
+            "sections": [section.title for section in (sections or entry.sections) if section.title],
+        }
 
-        return {}, content
+    def _parse_frontmatter(self, content: str) -> tuple[dict, str]:
+        """解析 YAML frontmatter"""
+        return parse_frontmatter(content)
 
     def _build_skill_context(self, base_dir: str, content: str, args: str) -> str:
         """构建 skill 上下文（注入到 LLM 的完整内容）"""
@@ -0,0 +1,201 @@
+"""工具的推测执行（speculative execution）。
+
+模型流式输出 tool call 时，参数往往早于整条消息结束就已完整。
+对只读、幂等的工具，一旦某个 tool call 的参数能解析成完整 JSON 就立即在后台执行；
+等图走到 tools 步骤时，若最终参数与推测时一致则直接复用结果，否则丢弃推测结果照常执行。
+
+通过环境变量 SPECULATIVE_TOOLS=1 开启。
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import get_async_callback_manager_for_config
+
+try:
+    from .tracing import current_trace
+except ImportError:
+    from tracing import current_trace
+
+# 只读、幂等、可安全提前执行的工具
+READ_ONLY_TOOLS = frozenset({
+    "get_component",
+    "search_components",
+    "list_available_components",
+    "get_weather",
+})
+
+
+def speculative_tools_enabled() -> bool:
+    return os.getenv("SPECULATIVE_TOOLS", "0").lower() in ("1", "true", "yes")
+
+
+class _Speculation:
+    __slots__ = ("name", "args", "task", "started_at", "finished_at")
+
+    def __init__(self, name: str, args: Dict[str, Any], task: asyncio.Task):
+        self.name = name
+        self.args = args
+        self.task = task
+        self.started_at = time.perf_counter()
+        self.finished_at: float | None = None
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, _task: asyncio.Task) -> None:
+        self.finished_at = time.perf_counter()
+
+
+def _retrieve_exception(task: asyncio.Task) -> None:
+    if not task.cancelled():
+        task.exception()
+
+
+class SpeculativeExecutor:
+    """一轮对话内的推测执行器：agent 节点喂入流式 chunk，tools 节点领取结果"""
+
+    def __init__(self, tools: list, read_only: frozenset[str] = READ_ONLY_TOOLS):
+        self.tools = {t.name: t for t in tools if t.name in read_only}
+        # 按 tool_call_chunk 的 index 累积：{index: {"name", "args"}}
+        self._buffers: Dict[int, Dict[str, str]] = {}
+        self._speculations: Dict[int, _Speculation] = {}
+        self.stats = {"tool_calls": 0, "speculated": 0, "hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+    def reset(self) -> None:
+        """新一次模型调用开始：丢弃上一轮未被领取的推测结果"""
+        for speculation in self._speculations.values():
+            self._discard(speculation)
+        self._buffers.clear()
+        self._speculations.clear()
+
+    def observe(self, chunk: Any) -> None:
+        """处理一个流式 AIMessageChunk，参数完整的只读工具立即开始执行"""
+        for tool_chunk in getattr(chunk, "tool_call_chunks", None) or []:
+            index = tool_chunk.get("index") or 0
+            buffer = self._buffers.setdefault(index, {"name": "", "args": ""})
+            buffer["name"] += tool_chunk.get("name") or ""
+            buffer["args"] += tool_chunk.get("args") or ""
+
+            if index in self._speculations or buffer["name"] not in self.tools:
+                continue
+            try:
+                args = json.loads(buffer["args"]) if buffer["args"] else None
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(args, dict):
+                continue
+
+            tool = self.tools[buffer["name"]]
+            # callbacks=[]：推测执行不产生 on_tool_start/end 事件，命中时由 tools 节点补发
+            task = asyncio.create_task(tool.ainvoke(args, config={"callbacks": []}))
+            self._speculations[index] = _Speculation(buffer["name"], args, task)
+            self.stats["speculated"] += 1
+
+    async def run_tools(self, message: AIMessage, tool_node: Any, config: RunnableConfig) -> Dict[str, list]:
+        """tools 节点：命中的 tool call 复用推测结果，其余交给 ToolNode 执行
+
+        领取推测结果与 ToolNode 执行未命中的 tool call 同时进行，未命中的调用不会排在推测任务后面；
+        推测失败的调用最后再交给 ToolNode 重跑。
+        """
+        requested_at = time.perf_counter()
+        pending = dict(self._speculations)
+        self._speculations.clear()
+
+        matched: list[tuple[Dict[str, Any], _Speculation]] = []
+        remaining = []
+        for tool_call in message.tool_calls:
+            self.stats["tool_calls"] += 1
+            speculation = self._match(pending, tool_call)
+            if speculation is None:
+                remaining.append(tool_call)
+            else:
+                matched.append((tool_call, speculation))
+
+        # 没有被领取的推测（参数不一致 / 最终没有对应的 tool call）
+        for speculation in pending.values():
+            self._discard(speculation)
+
+        async def claim(tool_call: Dict[str, Any], speculation: _Speculation) -> ToolMessage | None:
+            result = await self._collect(speculation, requested_at)
+            if result is None:
+                return None
+            tool_message = ToolMessage(content=result, name=tool_call["name"], tool_call_id=tool_call["id"])
+            await self._emit_tool_events(tool_call, tool_message, config)
+            return tool_message
+
+        claimed, executed = await asyncio.gather(
+            asyncio.gather(*(claim(tool_call, speculation) for tool_call, speculation in matched)),
+            self._run_tool_node(message, remaining, tool_node, config),
+        )
+
+        by_call: Dict[str, ToolMessage] = {m.tool_call_id: m for m in executed}
+        failed = []
+        for (tool_call, _), tool_message in zip(matched, claimed):
+            if tool_message is None:
+                failed.append(tool_call)
+            else:
+                by_call[tool_call["id"]] = tool_message
+        for tool_message in await self._run_tool_node(message, failed, tool_node, config):
+            by_call[tool_message.tool_call_id] = tool_message
+
+        return {"messages": [by_call[tc["id"]] for tc in message.tool_calls if tc["id"] in by_call]}
+
+    @staticmethod
+    async def _run_tool_node(message: AIMessage, tool_calls: list, tool_node: Any, config: RunnableConfig) -> list:
+        if not tool_calls:
+            return []
+        output = await tool_node.ainvoke(
+            {"messages": [AIMessage(content=message.content, tool_calls=tool_calls, id=message.id)]},
+            config,
+        )
+        return output["messages"]
+
+    def report(self) -> Dict[str, Any]:
+        """本轮推测命中率与节省的墙钟时间"""
+        speculated = self.stats["speculated"]
+        summary = {**self.stats, "hit_rate": self.stats["hits"] / speculated if speculated else 0.0}
+        trace = current_trace()
+        if trace is not None:
+            trace.instant("speculative_tools", cat="speculation", args=summary)
+        return summary
+
+    def _match(self, pending: Dict[int, _Speculation], tool_call: Dict[str, Any]) -> _Speculation | None:
+        for index, speculation in pending.items():
+            if speculation.name == tool_call["name"] and speculation.args == tool_call["args"]:
+                return pending.pop(index)
+        return None
+
+    async def _collect(self, speculation: _Speculation, requested_at: float) -> Any:
+        try:
+            result = await speculation.task
+        except Exception as e:
+            print(f"⚠️  Speculative {speculation.name} failed, re-running: {e}")
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        # 无推测时，工具要到 requested_at 才开始，耗时 finished - started；两者之差即节省的时间
+        finished_at = speculation.finished_at or time.perf_counter()
+        self.stats["saved_seconds"] += max(min(requested_at, finished_at) - speculation.started_at, 0.0)
+        return result
+
+    def _discard(self, speculation: _Speculation) -> None:
+        # 已失败的任务要读取一次异常，否则被回收时会打印 "Task exception was never retrieved"
+        speculation.task.add_done_callback(_retrieve_exception)
+        speculation.task.cancel()
+        self.stats["misses"] += 1
+
+    async def _emit_tool_events(self, tool_call: Dict[str, Any], tool_message: ToolMessage, config: RunnableConfig) -> None:
+        """为命中的推测结果补发 on_tool_start / on_tool_end，前端照常收到 tool_call / tool_result"""
+        callback_manager = get_async_callback_manager_for_config(config)
+        run_manager = await callback_manager.on_tool_start(
+            {"name": tool_call["name"]},
+            json.dumps(tool_call["args"], ensure_ascii=False),
+            name=tool_call["name"],
+            inputs=tool_call["args"],
+            tool_call_id=tool_call["id"],
+        )
+        await run_manager.on_tool_end(tool_message, name=tool_call["name"])
@@ -6,7 +6,16 @@ try:
 except Exception:  # pragma: no cover
     DDGS = None  # type: ignore
 import json
-from typing import Any, Dict
+from typing import Any, Dict, List
+
+try:
+    from .calc_engine import evaluate as evaluate_expression
+    from .geo_index import City, resolve_city, supported_cities
+    from .tracing import payload_size, trace_span
+except ImportError:
+    from calc_engine import evaluate as evaluate_expression
+    from geo_index import City, resolve_city, supported_cities
+    from tracing import payload_size, trace_span
 
 # MCP ComponentDoc Server URL
 MCP_SERVER_URL = "http://127.0.0.1:9527/mcp"
@@ -66,7 +75,11 @@ def _call_mcp_tool(name: str, arguments: Dict[str, Any] | None = None, timeout:
                 return result
             return {"result": result}
 
-    return asyncio.run(_run())
+    # 若当前请求开启了 trace，把这次 MCP 调用记录到时间线上
+    with trace_span(f"mcp:{name}", cat="mcp", args={"request_bytes": payload_size(arguments)}) as span:
+        result = asyncio.run(_run())
+        span["response_bytes"] = payload_size(result)
+        return result
 
 @tool
 def list_available_components() -> str:
@@ -194,81 +207,137 @@ def web_search(query: str, max_results: int = 5) -> str:
         return f"搜索失败: {str(e)}"
 
 @tool
-def calculator(expression: str) -> str:
-    """计算数学表达式"""
+def calculator(expression: str, variables: Dict[str, Any] | None = None) -> str:
+    """计算数学表达式（安全求值，支持数组向量化运算）
+
+    Args:
+        expression: 数学表达式，例如 "2 * (3 + 4)"、"pct(sales)"、"movavg(temps, 3)"
+        variables: 表达式中用到的变量，值可以是数字或数字数组，
+            例如 {"sales": [120, 80, 200]}。数组参与运算时逐元素计算，
+            一次调用即可算出整条图表序列
+
+    可用函数: abs, sqrt, exp, log, log10, sin, cos, tan, floor, ceil, round,
+    min, max, sum, mean, len, cumsum, diff, pct（占比百分比）, movavg（移动平均）
+    可用常量: pi, e
+
+    Returns:
+        标量结果返回数字字符串，数组结果返回 JSON 数组
+    """
     try:
-        result = eval(expression)
+        result = evaluate_expression(expression, variables)
+        if isinstance(result, list):
+            return json.dumps(result, ensure_ascii=False)
         return str(result)
     except Exception as e:
         return f"计算错误: {e}"
 
+# Open-Meteo 天气代码 -> (描述, 前端 Weather 组件的 condition)
+WEATHER_CODES: Dict[int, tuple[str, str]] = {
+    0: ("晴空", "sunny"), 1: ("基本晴", "sunny"), 2: ("局部多云", "cloudy"), 3: ("阴天", "cloudy"),
+    45: ("雾", "foggy"), 48: ("雾冻", "foggy"),
+    51: ("弱毛毛雨", "rainy"), 53: ("中毛毛雨", "rainy"), 55: ("强毛毛雨", "rainy"),
+    56: ("弱冻毛毛雨", "rainy"), 57: ("强冻毛毛雨", "rainy"),
+    61: ("小雨", "rainy"), 63: ("中雨", "rainy"), 65: ("大雨", "rainy"),
+    66: ("弱冻雨", "rainy"), 67: ("强冻雨", "rainy"),
+    71: ("小雪", "snowy"), 73: ("中雪", "snowy"), 75: ("大雪", "snowy"), 77: ("雪粒", "snowy"),
+    80: ("小阵雨", "rainy"), 81: ("中阵雨", "rainy"), 82: ("暴雨", "rainy"),
+    85: ("小阵雪", "snowy"), 86: ("大阵雪", "snowy"),
+    95: ("雷暴", "stormy"), 96: ("雷暴伴小冰雹", "stormy"), 99: ("雷暴伴大冰雹", "stormy"),
+}
+
+# 未在上表中的代码按区间归类，与前端 weather-data.ts 的 getWeatherFromCode 保持一致
+WEATHER_CODE_RANGES: list[tuple[int, int, str, str]] = [
+    (51, 57, "毛毛雨", "rainy"),
+    (61, 67, "雨", "rainy"),
+    (71, 77, "降雪", "snowy"),
+    (80, 82, "阵雨", "rainy"),
+    (85, 86, "阵雪", "snowy"),
+]
+
+
+def describe_weather_code(code: int) -> tuple[str, str]:
+    """WMO 天气代码 -> (中文描述, Weather 组件的 condition)"""
+    if code in WEATHER_CODES:
+        return WEATHER_CODES[code]
+    for low, high, description, condition in WEATHER_CODE_RANGES:
+        if low <= code <= high:
+            return description, condition
+    return "未知", "sunny"
+
+# 只请求 Weather 卡片实际渲染的字段，不再拉取用不到的 hourly 序列
+WEATHER_CURRENT_FIELDS = "temperature_2m,relative_humidity_2m,apparent_temperature,wind_speed_10m,weather_code"
+
+
 @tool
-def get_weather(city: str) -> str:
-    """查询城市天气信息
+def get_weather(cities: List[str]) -> str:
+    """批量查询城市当前天气（一次调用、一次上游请求覆盖所有城市）
 
     Args:
-        city: 城市名称，如 "北京"、"上海"、"London"、"New York"
+        cities: 城市名称列表，支持中文、英文、拼音和常用简称，
+            如 ["北京", "shanghai", "New York", "东京"]。查询单个城市时也传列表
 
     Returns:
-        天气信息，包括温度、湿度、风速等
+        JSON 字符串：
+        {
+            "weather": [  # 与 A2UI Weather 组件的 weatherData 结构一致
+                {"city", "temperature", "condition", "humidity", "windSpeed",
+                 "feelsLike", "timestamp", "weatherCode", "weatherDescription"}
+            ],
+            "unsupported": [...]  # 未收录的城市名
+        }
     """
-    # 城市坐标映射（常用城市）
-    city_coords = {
-        "北京": (39.9042, 116.4074),
-        "上海": (31.2304, 121.4737),
-        "深圳": (22.5431, 114.0579),
-        "广州": (23.1291, 113.2644),
-        "杭州": (30.2741, 120.1551),
-        "成都": (30.5728, 104.0668),
-        "london": (51.5074, -0.1278),
-        "new york": (40.7128, -74.0060),
-        "tokyo": (35.6762, 139.6503),
-        "paris": (48.8566, 2.3522),
-    }
-
-    city_lower = city.lower()
-    if city_lower not in city_coords:
-        return f"抱歉，暂不支持城市 '{city}'。支持的城市：{', '.join(list(city_coords.keys())[:5])} 等"
-
-    lat, lon = city_coords[city_lower]
+    locations: list[City] = []
+    unsupported: list[str] = []
+    seen: set[str] = set()
+    for city in cities:
+        resolved = resolve_city(city)
+        if resolved is None:
+            unsupported.append(city)
+        elif resolved.name not in seen:
+            seen.add(resolved.name)
+            locations.append(resolved)
+
+    if not locations:
+        return (
+            f"抱歉，暂不支持城市 {', '.join(repr(c) for c in unsupported)}。"
+            f"支持的城市：{', '.join(supported_cities()[:10])} 等"
+        )
 
     try:
-        # 使用 Open-Meteo API（无需 API Key）
+        # 使用 Open-Meteo API（无需 API Key），多个坐标用逗号拼接，一次请求取回全部城市
         url = "https://api.open-meteo.com/v1/forecast"
         params = {
-            "latitude": lat,
-            "longitude": lon,
-            "current_weather": True,
-            "hourly": "temperature_2m,relative_humidity_2m,wind_speed_10m"
+            "latitude": ",".join(str(loc.latitude) for loc in locations),
+            "longitude": ",".join(str(loc.longitude) for loc in locations),
+            "current": WEATHER_CURRENT_FIELDS,
+            "wind_speed_unit": "kmh",
+            "timezone": "auto",
         }
 
         response = httpx.get(url, params=params, timeout=10.0)
         response.raise_for_status()
         data = response.json()
-
-        current = data["current_weather"]
-        temp = current["temperature"]
-        windspeed = current["windspeed"]
-        weather_code = current["weathercode"]
-
-        # 天气代码映射
-        weather_desc_map = {
-            0: "晴空", 1: "基本晴", 2: "局部多云", 3: "阴天",
-            45: "雾", 48: "雾冻",
-            51: "弱毛毛雨", 53: "中毛毛雨", 55: "强毛毛雨",
-            61: "小雨", 63: "中雨", 65: "大雨",
-            71: "小雪", 73: "中雪", 75: "大雪",
-            80: "小阵雨", 81: "中阵雨", 82: "暴雨",
-            85: "小阵雪", 86: "大阵雪",
-            95: "雷暴", 96: "雷暴伴小冰雹", 99: "雷暴伴大冰雹"
-        }
-        weather_desc = weather_desc_map.get(weather_code, "未知")
-
-        return f"""{city} 当前天气：
-🌡️ 温度: {temp}°C
-💨 风速: {windspeed} km/h
-🌤️ 天气: {weather_desc}
-⏰ 更新时间: {current['time']}""".strip()
+        # 单个坐标时返回对象，多个坐标时返回数组
+        results = data if isinstance(data, list) else [data]
+
+        weather = []
+        for loc, result in zip(locations, results):
+            current = result["current"]
+            weather_code = current["weather_code"]
+            description, condition = describe_weather_code(weather_code)
+            weather.append({
+                "city": loc.name,
+                "temperature": current["temperature_2m"],
+                "condition": condition,
+                "humidity": current["relative_humidity_2m"],
+                "windSpeed": current["wind_speed_10m"],
+                "feelsLike": current["apparent_temperature"],
+                "timestamp": current["time"],
+                "weatherCode": weather_code,
+                "weatherDescription": description,
+            })
+
+        return json.dumps({"weather": weather, "unsupported": unsupported}, ensure_ascii=False)
 
     except Exception as e:
         return f"获取天气信息失败: {str(e)}"
@@ -0,0 +1,230 @@
+"""单轮对话的 trace 时间线（Chrome trace / Perfetto JSON 格式）。
+
+用于剖析单个慢请求：gateway 为被采样的请求创建 TurnTrace 并放入 contextvar，
+之后同一请求链路上的代码（LangGraph 事件循环、工具线程里的 MCP 调用等）
+都通过 trace_span / current_trace() 往同一条时间线上记事件。
+没有活动 trace 时这些调用都是空操作，不影响正常请求。
+
+导出的 JSON 可以直接拖进 chrome://tracing 或 https://ui.perfetto.dev 查看。
+设置 TRACE_DIR 时 trace 同时落盘，目录里最多保留 TRACE_DIR_MAX_FILES 个（默认 200）最新文件。
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+# 内存里保留最近多少条 trace（供 debug 接口读取）
+MAX_RECENT_TRACES = 50
+DEFAULT_TRACE_DIR_MAX_FILES = 200
+
+_current_trace: ContextVar["TurnTrace | None"] = ContextVar("a2ui_turn_trace", default=None)
+_recent_traces: "deque[TurnTrace]" = deque(maxlen=MAX_RECENT_TRACES)
+_recent_lock = threading.Lock()
+
+
+def payload_size(payload: Any) -> int:
+    """估算 payload 序列化后的字节数"""
+    if payload is None:
+        return 0
+    if isinstance(payload, (bytes, bytearray)):
+        return len(payload)
+    if isinstance(payload, str):
+        return len(payload.encode("utf-8"))
+    try:
+        return len(json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8"))
+    except Exception:
+        return len(str(payload).encode("utf-8"))
+
+
+class TurnTrace:
+    """一轮对话的事件时间线，时间戳单位为微秒（相对 trace 开始时刻）"""
+
+    def __init__(self, name: str = "chat_turn", trace_id: str | None = None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.name = name
+        self.pid = os.getpid()
+        self.started_at = time.time()
+        self._t0 = time.perf_counter_ns()
+        self._events: list[Dict[str, Any]] = []
+        self._open: Dict[str, tuple[int, str, str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def now_us(self) -> float:
+        return (time.perf_counter_ns() - self._t0) / 1000
+
+    def _append(self, event: Dict[str, Any]) -> None:
+        event.setdefault("pid", self.pid)
+        event.setdefault("tid", threading.get_ident())
+        with self._lock:
+            self._events.append(event)
+
+    def instant(self, name: str, cat: str = "event", args: Dict[str, Any] | None = None) -> None:
+        """记录瞬时事件（如一个流式 chunk）"""
+        self._append({"name": name, "cat": cat, "ph": "i", "s": "t", "ts": self.now_us(), "args": args or {}})
+
+    def complete(self, name: str, start_us: float, cat: str = "span", args: Dict[str, Any] | None = None) -> None:
+        """记录从 start_us 到现在的完整区间"""
+        end_us = self.now_us()
+        self._append({
+            "name": name, "cat": cat, "ph": "X",
+            "ts": start_us, "dur": max(end_us - start_us, 0.0), "args": args or {},
+        })
+
+    def begin(self, key: str, name: str, cat: str = "span", args: Dict[str, Any] | None = None) -> None:
+        """开始一个按 key（如 LangGraph run_id）配对的区间，由 end() 收尾"""
+        with self._lock:
+            self._open[key] = (self.now_us(), name, cat, dict(args or {}))
+
+    def end(self, key: str, args: Dict[str, Any] | None = None) -> None:
+        with self._lock:
+            opened = self._open.pop(key, None)
+        if opened is None:
+            return
+        start_us, name, cat, begin_args = opened
+        begin_args.update(args or {})
+        self.complete(name, start_us, cat=cat, args=begin_args)
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        with self._lock:
+            events = list(self._events)
+            # 未结束的区间（如客户端中途断开）也导出，持续到导出时刻
+            dangling = list(self._open.values())
+        now = self.now_us()
+        for start_us, name, cat, args in dangling:
+            events.append({
+                "name": name, "cat": cat, "ph": "X", "ts": start_us, "dur": now - start_us,
+                "pid": self.pid, "tid": 0, "args": {**args, "unfinished": True},
+            })
+        events.append({
+            "name": "process_name", "ph": "M", "pid": self.pid, "tid": 0,
+            "args": {"name": f"{self.name} {self.trace_id}"},
+        })
+        return {
+            "traceEvents": sorted(events, key=lambda e: e.get("ts", 0)),
+            "displayTimeUnit": "ms",
+            "otherData": {"trace_id": self.trace_id, "started_at": self.started_at},
+        }
+
+
+def current_trace() -> TurnTrace | None:
+    return _current_trace.get()
+
+
+def activate(trace: TurnTrace) -> Any:
+    """把 trace 设为当前上下文的活动 trace，返回用于 deactivate 的 token"""
+    return _current_trace.set(trace)
+
+
+def deactivate(token: Any) -> None:
+    try:
+        _current_trace.reset(token)
+    except ValueError:
+        # 异步生成器可能在不同的 context 里被关闭，此时直接清空即可
+        _current_trace.set(None)
+
+
+@contextmanager
+def trace_span(name: str, cat: str = "span", args: Dict[str, Any] | None = None) -> Iterator[Dict[str, Any]]:
+    """在活动 trace 上记录一个区间；yield 出的 dict 可在区间内追加 args"""
+    trace = _current_trace.get()
+    span_args: Dict[str, Any] = dict(args or {})
+    if trace is None:
+        yield span_args
+        return
+    start_us = trace.now_us()
+    try:
+        yield span_args
+    except BaseException as e:
+        span_args["error"] = repr(e)
+        raise
+    finally:
+        trace.complete(name, start_us, cat=cat, args=span_args)
+
+
+def finish(trace: TurnTrace) -> Path | None:
+    """trace 收尾：放入最近列表；若设置了 TRACE_DIR 则同时落盘，返回文件路径"""
+    _remember(trace)
+    return _write_trace_file(trace)
+
+
+async def afinish(trace: TurnTrace) -> Path | None:
+    """finish 的异步版本：序列化与写文件放到线程里，不阻塞事件循环"""
+    _remember(trace)
+    return await asyncio.to_thread(_write_trace_file, trace)
+
+
+def _remember(trace: TurnTrace) -> None:
+    with _recent_lock:
+        _recent_traces.append(trace)
+
+
+def _max_trace_files() -> int:
+    try:
+        return int(os.getenv("TRACE_DIR_MAX_FILES", DEFAULT_TRACE_DIR_MAX_FILES))
+    except ValueError:
+        return DEFAULT_TRACE_DIR_MAX_FILES
+
+
+def _write_trace_file(trace: TurnTrace) -> Path | None:
+    trace_dir = os.getenv("TRACE_DIR")
+    if not trace_dir:
+        return None
+    path = Path(trace_dir) / f"{trace.trace_id}.json"
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(trace.to_chrome_trace(), ensure_ascii=False, default=str), encoding="utf-8")
+        _prune_trace_dir(path, _max_trace_files())
+    except OSError as e:
+        print(f"⚠️  Failed to write trace {trace.trace_id}: {e}")
+        return None
+    return path
+
+
+def _prune_trace_dir(latest: Path, max_files: int) -> None:
+    """目录里只保留最新的 max_files 个 trace 文件（<= 0 表示不限制），刚写入的 latest 一定保留；
+    只处理 trace_id 命名的文件"""
+    if max_files <= 0:
+        return
+    files = [
+        p for p in latest.parent.glob("*.json")
+        if p != latest and len(p.stem) == 32 and all(c in "0123456789abcdef" for c in p.stem)
+    ]
+    keep = max_files - 1
+    if len(files) <= keep:
+        return
+    files.sort(key=_mtime)
+    for stale in files[:len(files) - keep]:
+        stale.unlink(missing_ok=True)
+
+
+def _mtime(path: Path) -> float:
+    # 并发收尾的其他请求可能刚删掉这个文件
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return 0.0
+
+
+def get_recent_trace(trace_id: str) -> TurnTrace | None:
+    with _recent_lock:
+        for trace in _recent_traces:
+            if trace.trace_id == trace_id:
+                return trace
+    return None
+
+
+def list_recent_traces() -> list[Dict[str, Any]]:
+    with _recent_lock:
+        traces = list(_recent_traces)
+    return [
+        {"trace_id": t.trace_id, "name": t.name, "started_at": t.started_at}
+        for t in reversed(traces)
+    ]
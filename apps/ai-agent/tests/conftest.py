@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# 与 gateway 一致：直接把 src 目录加入 sys.path 导入 agent 模块
+AGENT_SRC = Path(__file__).resolve().parents[1] / "src"
+if str(AGENT_SRC) not in sys.path:
+    sys.path.insert(0, str(AGENT_SRC))
@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip("langgraph")
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+import agent
+from skill_loader import SkillLoader
+from test_skill_loader import A2UI_SKILL
+
+
+@pytest.fixture(autouse=True)
+def skills_dir(tmp_path, monkeypatch):
+    (tmp_path / "a2ui").mkdir()
+    (tmp_path / "a2ui" / "SKILL.md").write_text(A2UI_SKILL, encoding="utf-8")
+    monkeypatch.setattr(agent, "SkillLoader", lambda: SkillLoader(tmp_path))
+
+
+def test_plain_question_gets_plain_prompt():
+    message = agent.build_system_message("tell me a joke")
+    assert message.startswith("You are a helpful assistant.")
+    assert agent.A2UI_OUTPUT_FORMAT.strip() not in message
+
+
+def test_ui_request_gets_a2ui_prompt():
+    message = agent.build_system_message("北京天气怎么样")
+    assert "A2UI protocol" in message
+    assert agent.A2UI_OUTPUT_FORMAT.strip() in message
+
+
+def test_ui_tool_result_adds_a2ui_even_without_keyword_hit():
+    message = agent.build_system_message("what about 上海?", ui_tool_used=True)
+    assert "A2UI protocol" in message
+    assert "Weather component data" in message
+    assert agent.A2UI_OUTPUT_FORMAT.strip() in message
+
+
+def test_has_ui_tool_result():
+    messages = [HumanMessage("hi"), AIMessage("")]
+    assert not agent.has_ui_tool_result(messages)
+    assert not agent.has_ui_tool_result(messages + [ToolMessage("42", tool_call_id="1", name="calculator")])
+    assert agent.has_ui_tool_result(messages + [ToolMessage("{}", tool_call_id="2", name="get_weather")])
@@ -0,0 +1,114 @@
+import time
+
+import pytest
+
+import calc_engine
+from calc_engine import ExpressionError, evaluate
+
+
+@pytest.fixture(params=["python", "numpy"])
+def backend(request, monkeypatch):
+    """同一用例分别跑纯 Python 后端与 numpy 后端（未安装 numpy 时跳过后者）"""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(calc_engine, "np", None)
+    return request.param
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("2 * (3 + 4)", 14),
+    ("-2 ** 2", -4),
+    ("round(pi, 2)", 3.14),
+    ("max(1, 5, 3)", 5),
+    ("2 ** 10 * 3", 3072),
+])
+def test_scalar_expressions(expression, expected):
+    assert evaluate(expression) == expected
+
+
+def test_array_expressions(backend):
+    assert evaluate("pct(x)", {"x": [1, 1, 2]}) == [25.0, 25.0, 50.0]
+    assert evaluate("movavg(x, 2)", {"x": [1, 2, 3, 4]}) == [1.5, 2.5, 3.5]
+    assert evaluate("cumsum([1, 2, 3])") == [1.0, 3.0, 6.0]
+    assert evaluate("x * 2 + 1", {"x": [1, 2]}) == [3.0, 5.0]
+
+
+@pytest.mark.parametrize("expression", [
+    '__import__("os")',
+    "().__class__",
+    "x.y",
+    "open(1)",
+    "eval(1)",
+    '"a" * 3',
+    "lambda: 1",
+    "[i for i in [1]]",
+    "_pow(2, 3)",
+    "sum",
+    "round(1, ndigits=2)",
+    "True + 1",
+])
+def test_rejects_non_whitelisted_syntax(expression):
+    with pytest.raises(ExpressionError):
+        evaluate(expression, {"x": 1})
+
+
+def test_rejects_undefined_and_non_numeric_variables():
+    with pytest.raises(ExpressionError):
+        evaluate("x + 1")
+    with pytest.raises(ExpressionError):
+        evaluate("x + 1", {"x": "1"})
+
+
+@pytest.mark.parametrize("expression", [
+    "9 ** 9 ** 9",
+    "((10 ** 1000) ** 1000) ** 10",
+    "((10 ** 1000) ** 1000) ** 1000",
+    "(10 ** 1000) ** 4",
+    "(2 ** 1000) ** 5 * (2 ** 1000) ** 5",
+    "(10 ** 1000) ** 1.5",
+    "10.0 ** 400",
+])
+def test_rejects_oversized_results_quickly(expression):
+    start = time.process_time()
+    with pytest.raises(ExpressionError):
+        evaluate(expression)
+    assert time.process_time() - start < 1.0
+
+
+def test_allows_large_results_within_cap():
+    assert evaluate("(2 ** 1000) ** 9") == 2 ** 9000
+    assert evaluate("(2 ** 1000) ** 4 * (2 ** 1000) ** 4") == 2 ** 8000
+
+
+@pytest.mark.parametrize("expression, variables", [
+    ("x / 0", {"x": [1.0, 2.0]}),
+    ("x ** 1000", {"x": [10.0]}),
+    ("log(x)", {"x": [0.0]}),
+    ("sqrt(x)", {"x": [-1.0]}),
+    ("x % 0", {"x": [1.0]}),
+    ("1e308 * 10", None),
+    ("x * 1e308", {"x": [10.0]}),
+])
+def test_non_finite_results_rejected_on_both_backends(backend, expression, variables):
+    with pytest.raises(ExpressionError):
+        evaluate(expression, variables)
+
+
+def test_underflow_is_not_an_error(backend):
+    assert evaluate("exp(x)", {"x": [-1000.0]}) == [0.0]
+
+
+@pytest.mark.parametrize("expression, variables", [
+    ("[x, x]", {"x": [1, 2]}),
+    ("sum([x, x])", {"x": list(range(calc_engine.MAX_ARRAY_LENGTH))}),
+    ("x + 1", {"x": [[1, 2], [3, 4]]}),
+])
+def test_only_one_dimensional_arrays(backend, expression, variables):
+    with pytest.raises(ExpressionError):
+        evaluate(expression, variables)
+
+
+def test_deep_nesting_is_expression_error():
+    with pytest.raises(ExpressionError):
+        evaluate("-" * 999 + "1")
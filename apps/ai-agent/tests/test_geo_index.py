@@ -0,0 +1,38 @@
+import pytest
+
+from geo_index import resolve_city, supported_cities
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("北京", "北京"),
+    ("北京市", "北京"),
+    ("Beijing", "北京"),
+    ("  PEKING ", "北京"),
+    ("京", "北京"),
+    ("New York", "纽约"),
+    ("new-york", "纽约"),
+    ("NYC", "纽约"),
+    ("Xi'an", "西安"),
+    ("xian", "西安"),
+    ("Hong Kong", "香港"),
+    ("三藩市", "旧金山"),
+])
+def test_resolve_aliases(name, expected):
+    city = resolve_city(name)
+    assert city is not None and city.name == expected
+
+
+def test_city_suffix_only_stripped_from_longer_names():
+    # 单字简称加「市」不应被误判成简称
+    assert resolve_city("京市") is None
+
+
+def test_unknown_city():
+    assert resolve_city("Atlantis") is None
+    assert resolve_city("") is None
+
+
+def test_supported_cities_deduplicated_in_table_order():
+    cities = supported_cities()
+    assert len(cities) == len(set(cities))
+    assert cities[:3] == ["北京", "上海", "广州"]
@@ -0,0 +1,213 @@
+import asyncio
+from typing import Any, AsyncIterator
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from llm_pool import ainvoke_hedged
+
+HEDGE_AFTER = 0.02
+
+
+class StubStream:
+    """按脚本出 chunk 的流：首个 chunk 前等待 delay（或 gate），记录是否被关闭"""
+
+    def __init__(self, name: str, delay: float = 0.0, fail: bool = False, gate: asyncio.Event | None = None):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.gate = gate
+        self.closed = False
+        self._chunks = [f"{name}-1", f"{name}-2"]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> AIMessageChunk:
+        try:
+            if self.gate is not None:
+                await self.gate.wait()
+                self.gate = None
+            elif self.delay:
+                await asyncio.sleep(self.delay)
+                self.delay = 0.0
+        except asyncio.CancelledError:
+            self.closed = True
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed")
+        if not self._chunks:
+            raise StopAsyncIteration
+        return AIMessageChunk(content=self._chunks.pop(0))
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+class StubModel:
+    """依次返回预先准备的 StubStream，模拟主请求 + 对冲请求"""
+
+    def __init__(self, *streams: StubStream):
+        self.streams = list(streams)
+        self.calls = 0
+
+    def astream(self, messages: list, config: Any = None) -> StubStream:
+        stream = self.streams[self.calls]
+        self.calls += 1
+        return stream
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_primary_wins_without_hedge():
+    primary = StubStream("primary")
+    model = StubModel(primary, StubStream("hedge"))
+
+    result = run(ainvoke_hedged(model, [], HEDGE_AFTER))
+
+    assert result.content == "primary-1primary-2"
+    assert model.calls == 1
+
+
+def test_primary_wins_after_hedge_sent():
+    async def scenario():
+        primary = StubStream("primary", delay=HEDGE_AFTER * 2)
+        hedge = StubStream("hedge", delay=1.0)
+        model = StubModel(primary, hedge)
+        result = await ainvoke_hedged(model, [], HEDGE_AFTER)
+        return result, model, hedge
+
+    result, model, hedge = run(scenario())
+
+    assert result.content == "primary-1primary-2"
+    assert model.calls == 2
+    assert hedge.closed
+
+
+def test_hedge_wins_after_deadline():
+    async def scenario():
+        primary = StubStream("primary", delay=1.0)
+        hedge = StubStream("hedge")
+        seen = []
+        result = await ainvoke_hedged(StubModel(primary, hedge), [], HEDGE_AFTER, on_chunk=seen.append)
+        return result, primary, seen
+
+    result, primary, seen = run(scenario())
+
+    assert result.content == "hedge-1hedge-2"
+    assert primary.closed
+    assert [chunk.content for chunk in seen] == ["hedge-1", "hedge-2"]
+
+
+def test_primary_fails_and_hedge_succeeds():
+    async def scenario():
+        primary = StubStream("primary", delay=HEDGE_AFTER * 2, fail=True)
+        hedge = StubStream("hedge", delay=HEDGE_AFTER * 3)
+        return await ainvoke_hedged(StubModel(primary, hedge), [], HEDGE_AFTER)
+
+    assert run(scenario()).content == "hedge-1hedge-2"
+
+
+def test_all_attempts_fail_raises_first_error():
+    async def scenario():
+        primary = StubStream("primary", delay=HEDGE_AFTER * 2, fail=True)
+        hedge = StubStream("hedge", delay=HEDGE_AFTER * 3, fail=True)
+        return await ainvoke_hedged(StubModel(primary, hedge), [], HEDGE_AFTER)
+
+    with pytest.raises(RuntimeError, match="primary failed"):
+        run(scenario())
+
+
+def test_loser_stream_with_first_chunk_is_closed():
+    async def scenario():
+        gate = asyncio.Event()
+        primary = StubStream("primary", gate=gate)
+        hedge = StubStream("hedge", gate=gate)
+        # 对冲请求发出后两边同时出首个 chunk：保留主请求，关闭已打开的对冲流
+        asyncio.get_running_loop().call_later(HEDGE_AFTER * 2, gate.set)
+        result = await ainvoke_hedged(StubModel(primary, hedge), [], HEDGE_AFTER)
+        return result, hedge
+
+    result, hedge = run(scenario())
+
+    assert result.content == "primary-1primary-2"
+    assert hedge.closed
+
+
+class ScriptedChatModel(BaseChatModel):
+    """真实 BaseChatModel：第 n 次调用在首个 chunk 前等待 delays[n] 秒，回复 "call<n>" """
+
+    delays: list[float]
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        raise NotImplementedError
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        call = self.calls
+        self.calls += 1
+        await asyncio.sleep(self.delays[call])
+        for token in (f"call{call}", "-done"):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+class RecordingHandler(AsyncCallbackHandler):
+    def __init__(self):
+        self.starts = 0
+        self.tokens: list[str] = []
+        self.errors = 0
+
+    async def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        self.starts += 1
+
+    async def on_llm_new_token(self, token, **kwargs) -> None:
+        self.tokens.append(token)
+
+    async def on_llm_error(self, error, **kwargs) -> None:
+        self.errors += 1
+
+
+def test_loser_callbacks_never_reach_config_handlers():
+    handler = RecordingHandler()
+    model = ScriptedChatModel(delays=[1.0, 0.0])
+
+    result = run(ainvoke_hedged(model, [HumanMessage("hi")], HEDGE_AFTER, config={"callbacks": [handler]}))
+
+    assert result.content == "call1-done"
+    assert model.calls == 2
+    assert handler.starts == 1
+    assert handler.errors == 0
+    assert [t for t in handler.tokens if t] == ["call1", "-done"]
+
+
+def test_bound_model_emits_single_run_in_astream_events():
+    # bind_tools 返回的 RunnableBinding 会从上下文合并父 config，这里确认落败请求的事件同样被挡住
+    model = ScriptedChatModel(delays=[1.0, 0.0]).bind(stop=None)
+
+    async def call_model(_, config):
+        return await ainvoke_hedged(model, [HumanMessage("hi")], HEDGE_AFTER, config=config)
+
+    async def scenario():
+        events = []
+        async for event in RunnableLambda(call_model).astream_events("go", version="v2"):
+            if event["event"].startswith("on_chat_model"):
+                events.append((event["event"], getattr(event["data"].get("chunk"), "content", None)))
+        return events
+
+    events = run(scenario())
+
+    assert [e for e, _ in events].count("on_chat_model_start") == 1
+    assert [c for e, c in events if e == "on_chat_model_stream" and c] == ["call1", "-done"]
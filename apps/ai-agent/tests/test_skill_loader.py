@@ -0,0 +1,76 @@
+import pytest
+
+from skill_loader import SkillLoader
+
+A2UI_SKILL = """---
+name: a2ui
+description: Generate rich UI interfaces with the A2UI protocol
+---
+# A2UI
+
+Intro.
+
+## Message Format
+surfaceUpdate / dataModelUpdate / beginRendering
+
+## Components
+Text, Button, Card
+
+## Forms
+Input and Checkbox
+
+## Weather Card
+Weather component data
+"""
+
+
+@pytest.fixture
+def loader(tmp_path):
+    (tmp_path / "a2ui").mkdir()
+    (tmp_path / "a2ui" / "SKILL.md").write_text(A2UI_SKILL, encoding="utf-8")
+    return SkillLoader(tmp_path)
+
+
+def sections_for(loader, query):
+    selected = {skill["name"]: skill["sections"] for skill in loader.select_skills(query)}
+    return selected.get("a2ui")
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("make a login form", ["Message Format", "Forms"]),
+    ("帮我做一个登录表单", ["Message Format", "Forms"]),
+    ("北京天气怎么样", ["Message Format", "Weather Card"]),
+    ("show me the weather in tokyo", ["Message Format", "Weather Card"]),
+])
+def test_ui_requests_select_a2ui_with_core_sections(loader, query, expected):
+    assert sections_for(loader, query) == expected
+
+
+@pytest.mark.parametrize("query", ["What is the message you got?", "2 + 2 等于几", "tell me a joke"])
+def test_plain_questions_skip_a2ui(loader, query):
+    assert sections_for(loader, query) is None
+
+
+def test_ui_request_without_section_hit_keeps_everything(loader):
+    assert sections_for(loader, "render something nice") == ["Message Format", "Components", "Forms", "Weather Card"]
+
+
+def test_frontmatter_keywords_and_core_sections_override_defaults(tmp_path):
+    (tmp_path / "a2ui").mkdir()
+    (tmp_path / "a2ui" / "SKILL.md").write_text(
+        A2UI_SKILL.replace("---\n# A2UI", "keywords: [gizmo]\ncore_sections: [Components]\n---\n# A2UI"),
+        encoding="utf-8",
+    )
+    loader = SkillLoader(tmp_path)
+    assert sections_for(loader, "show a form") is None
+    assert sections_for(loader, "gizmo form") == ["Components", "Forms"]
+
+
+def test_skill_file_added_to_existing_directory_is_picked_up(tmp_path):
+    (tmp_path / "charts").mkdir()
+    loader = SkillLoader(tmp_path)
+    assert loader.registry.get("charts") is None
+
+    (tmp_path / "charts" / "SKILL.md").write_text("---\nname: charts\ndescription: Chart helpers\n---\nBody\n", encoding="utf-8")
+
+    assert loader.registry.get("charts") is not None
@@ -0,0 +1,227 @@
+import asyncio
+import gc
+
+import pytest
+
+pytest.importorskip("langgraph")
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.tools import tool
+from langgraph.graph import END, START, MessagesState, StateGraph
+from langgraph.prebuilt import ToolNode
+
+from speculative import SpeculativeExecutor
+
+
+class CallLog:
+    """记录工具被实际执行的参数与完成顺序"""
+
+    def __init__(self):
+        self.calls: list[tuple[str, str]] = []
+        self.done: list[str] = []
+        self.fail_next = False
+        self.fail_on_cancel = False
+        self.delay = 0.0
+
+
+def make_tools(log: CallLog) -> list:
+    @tool
+    async def lookup(q: str) -> str:
+        """只读查询"""
+        log.calls.append(("lookup", q))
+        if log.delay:
+            try:
+                await asyncio.sleep(log.delay)
+            except asyncio.CancelledError:
+                if log.fail_on_cancel:
+                    raise RuntimeError("lookup interrupted")
+                raise
+        if log.fail_next:
+            log.fail_next = False
+            raise RuntimeError("lookup failed")
+        log.done.append("lookup")
+        return f"result:{q}"
+
+    @tool
+    async def search(q: str) -> str:
+        """非只读工具，不做推测"""
+        log.calls.append(("search", q))
+        log.done.append("search")
+        return f"search:{q}"
+
+    return [lookup, search]
+
+
+def make_executor(log: CallLog) -> tuple[SpeculativeExecutor, ToolNode]:
+    tools = make_tools(log)
+    return SpeculativeExecutor(tools, read_only=frozenset({"lookup"})), ToolNode(tools)
+
+
+async def run_tools(executor: SpeculativeExecutor, tool_node: ToolNode, message: AIMessage, config: dict | None = None) -> dict:
+    """和 agent.py 一样在图的 tools 节点里调用 run_tools（ToolNode 需要图的运行时）"""
+
+    async def call_tools(state: MessagesState, config):
+        return await executor.run_tools(state["messages"][-1], tool_node, config)
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("tools", call_tools)
+    graph.add_edge(START, "tools")
+    graph.add_edge("tools", END)
+    output = await graph.compile().ainvoke({"messages": [message]}, config)
+    return {"messages": output["messages"][1:]}
+
+
+def chunk(index: int, name: str = "", args: str = "", call_id: str | None = None) -> AIMessageChunk:
+    return AIMessageChunk(content="", tool_call_chunks=[{"index": index, "name": name or None, "args": args, "id": call_id}])
+
+
+def final_message(*calls: tuple[str, str, str]) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": n, "args": {"q": q}, "id": i} for n, q, i in calls])
+
+
+class RecordingHandler(AsyncCallbackHandler):
+    def __init__(self):
+        self.events: list[tuple[str, str]] = []
+
+    async def on_tool_start(self, serialized, input_str, **kwargs) -> None:
+        self.events.append(("start", kwargs.get("name") or serialized.get("name")))
+
+    async def on_tool_end(self, output, **kwargs) -> None:
+        self.events.append(("end", getattr(output, "tool_call_id", None)))
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_chunks_accumulate_by_index():
+    async def scenario():
+        log = CallLog()
+        executor, _ = make_executor(log)
+        # 两个 tool call 的参数片段交错到达
+        executor.observe(chunk(0, "lookup", '{"q": ', "c1"))
+        executor.observe(chunk(1, "look", '{"q"', "c2"))
+        executor.observe(chunk(1, "up", ': "b"}'))
+        executor.observe(chunk(0, args='"a"}'))
+        await asyncio.sleep(0)
+        speculated = {i: s.args for i, s in executor._speculations.items()}
+        executor.reset()
+        return speculated, executor.stats
+
+    speculated, stats = run(scenario())
+
+    assert speculated == {0: {"q": "a"}, 1: {"q": "b"}}
+    assert stats["speculated"] == 2
+
+
+def test_incomplete_args_are_not_speculated():
+    log = CallLog()
+    executor, _ = make_executor(log)
+
+    async def scenario():
+        executor.observe(chunk(0, "lookup", '{"q": "a"', "c1"))
+        executor.observe(chunk(1, "search", '{"q": "b"}', "c2"))
+        return dict(executor._speculations)
+
+    assert run(scenario()) == {}
+
+
+def test_matching_args_reuse_speculation():
+    async def scenario():
+        log = CallLog()
+        executor, tool_node = make_executor(log)
+        executor.observe(chunk(0, "lookup", '{"q": "a"}', "c1"))
+        output = await run_tools(executor, tool_node, final_message(("lookup", "a", "c1")), {})
+        return output, log, executor.report()
+
+    output, log, report = run(scenario())
+
+    assert [m.content for m in output["messages"]] == ["result:a"]
+    assert output["messages"][0].tool_call_id == "c1"
+    assert log.calls == [("lookup", "a")]
+    assert report["hits"] == 1 and report["misses"] == 0
+
+
+def test_different_args_fall_back_to_tool_node():
+    async def scenario():
+        log = CallLog()
+        executor, tool_node = make_executor(log)
+        executor.observe(chunk(0, "lookup", '{"q": "a"}', "c1"))
+        output = await run_tools(executor, tool_node, final_message(("lookup", "b", "c1")), {})
+        return output, log, executor.stats
+
+    output, log, stats = run(scenario())
+
+    assert [m.content for m in output["messages"]] == ["result:b"]
+    assert ("lookup", "b") in log.calls
+    assert stats["hits"] == 0 and stats["misses"] == 1
+
+
+def test_failed_speculation_is_rerun():
+    async def scenario():
+        log = CallLog()
+        log.fail_next = True
+        executor, tool_node = make_executor(log)
+        executor.observe(chunk(0, "lookup", '{"q": "a"}', "c1"))
+        output = await run_tools(executor, tool_node, final_message(("lookup", "a", "c1")), {})
+        return output, log, executor.stats
+
+    output, log, stats = run(scenario())
+
+    assert [m.content for m in output["messages"]] == ["result:a"]
+    assert log.calls == [("lookup", "a"), ("lookup", "a")]
+    assert stats["hits"] == 0 and stats["misses"] == 1
+
+
+def test_unmatched_calls_run_while_speculation_is_pending():
+    async def scenario():
+        log = CallLog()
+        log.delay = 0.1
+        executor, tool_node = make_executor(log)
+        executor.observe(chunk(0, "lookup", '{"q": "a"}', "c1"))
+        output = await run_tools(executor, tool_node, final_message(("lookup", "a", "c1"), ("search", "x", "c2")), {})
+        return output, log
+
+    output, log = run(scenario())
+
+    # 非推测的 search 不必等慢的推测任务完成；结果仍按 tool_calls 的顺序返回
+    assert log.done == ["search", "lookup"]
+    assert [m.tool_call_id for m in output["messages"]] == ["c1", "c2"]
+
+
+@pytest.mark.parametrize("fail_on_cancel", [False, True])
+def test_discarded_failed_speculation_does_not_warn(fail_on_cancel):
+    # 推测任务在被丢弃前已失败 / 被取消时抛出其他异常，都不应留下 "Task exception was never retrieved"
+    unretrieved = []
+
+    async def scenario():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unretrieved.append(context))
+        log = CallLog()
+        log.fail_next = not fail_on_cancel
+        log.fail_on_cancel = fail_on_cancel
+        log.delay = 0.05 if fail_on_cancel else 0.0
+        executor, tool_node = make_executor(log)
+        executor.observe(chunk(0, "lookup", '{"q": "a"}', "c1"))
+        await asyncio.sleep(0.01)
+        await run_tools(executor, tool_node, final_message(("lookup", "b", "c1")), {})
+        await asyncio.sleep(0.01)
+        gc.collect()
+
+    run(scenario())
+
+    assert unretrieved == []
+
+
+def test_hit_replays_tool_events():
+    async def scenario():
+        log = CallLog()
+        handler = RecordingHandler()
+        executor, tool_node = make_executor(log)
+        executor.observe(chunk(0, "lookup", '{"q": "a"}', "c1"))
+        await run_tools(executor, tool_node, final_message(("lookup", "a", "c1")), {"callbacks": [handler]})
+        return handler
+
+    handler = run(scenario())
+
+    assert handler.events == [("start", "lookup"), ("end", "c1")]
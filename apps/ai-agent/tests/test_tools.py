@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+import tools
+
+
+def _current(code: int, temperature: float = 20.0) -> dict:
+    return {
+        "current": {
+            "time": "2026-01-01T12:00",
+            "temperature_2m": temperature,
+            "relative_humidity_2m": 50,
+            "apparent_temperature": temperature - 1,
+            "wind_speed_10m": 10.0,
+            "weather_code": code,
+        }
+    }
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self):
+        return self._data
+
+
+@pytest.fixture
+def open_meteo(monkeypatch):
+    """替换 httpx.get：返回预设的 Open-Meteo 响应，并记录请求参数"""
+    calls = []
+
+    def install(data):
+        def fake_get(url, params=None, timeout=None):
+            calls.append(params)
+            return FakeResponse(data)
+
+        monkeypatch.setattr(tools.httpx, "get", fake_get)
+        return calls
+
+    return install
+
+
+def _weather(cities):
+    return json.loads(tools.get_weather.invoke({"cities": cities}))
+
+
+def test_single_city_response_is_an_object(open_meteo):
+    calls = open_meteo(_current(0))
+
+    result = _weather(["上海市"])
+
+    assert len(calls) == 1
+    assert [w["city"] for w in result["weather"]] == ["上海"]
+    assert result["weather"][0]["condition"] == "sunny"
+    assert result["unsupported"] == []
+
+
+def test_multiple_cities_share_one_request_and_list_response(open_meteo):
+    calls = open_meteo([_current(61, 10.0), _current(71, -3.0)])
+
+    result = _weather(["北京", "beijing", "Tokyo", "Atlantis"])
+
+    assert len(calls) == 1
+    assert calls[0]["latitude"].count(",") == 1
+    assert [(w["city"], w["condition"], w["temperature"]) for w in result["weather"]] == [
+        ("北京", "rainy", 10.0),
+        ("东京", "snowy", -3.0),
+    ]
+    assert result["unsupported"] == ["Atlantis"]
+
+
+def test_only_unsupported_cities_skip_request(open_meteo):
+    calls = open_meteo({})
+
+    result = tools.get_weather.invoke({"cities": ["Atlantis"]})
+
+    assert calls == []
+    assert "Atlantis" in result
+
+
+@pytest.mark.parametrize("code, condition", [
+    (56, "rainy"), (57, "rainy"), (66, "rainy"), (67, "rainy"), (77, "snowy"),
+    (45, "foggy"), (96, "stormy"), (3, "cloudy"),
+])
+def test_weather_codes_match_frontend_mapping(code, condition):
+    assert tools.describe_weather_code(code)[1] == condition
+
+
+def test_unknown_weather_code():
+    assert tools.describe_weather_code(42) == ("未知", "sunny")
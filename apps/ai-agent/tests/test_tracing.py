@@ -0,0 +1,90 @@
+import asyncio
+import json
+import os
+import time
+
+import tracing
+from tracing import TurnTrace
+
+
+def test_chrome_trace_events_sorted_with_metadata():
+    trace = TurnTrace("chat_stream")
+    trace.begin("run-1", "chat_model:ChatOpenAI", cat="chat_model", args={"input_bytes": 10})
+    trace.instant("on_chat_model_stream", cat="stream", args={"bytes": 3})
+    trace.end("run-1", args={"output_bytes": 20})
+    trace.begin("run-2", "tool:get_weather", cat="tool")
+
+    exported = trace.to_chrome_trace()
+    events = exported["traceEvents"]
+
+    assert exported["displayTimeUnit"] == "ms"
+    assert exported["otherData"]["trace_id"] == trace.trace_id
+    timestamps = [e.get("ts", 0) for e in events]
+    assert timestamps == sorted(timestamps)
+    json.dumps(exported)  # 可直接序列化
+
+    span = next(e for e in events if e["name"] == "chat_model:ChatOpenAI")
+    assert span["ph"] == "X" and span["dur"] >= 0
+    assert span["args"] == {"input_bytes": 10, "output_bytes": 20}
+
+    instant = next(e for e in events if e["name"] == "on_chat_model_stream")
+    assert instant["ph"] == "i" and instant["args"] == {"bytes": 3}
+
+    # 没有 end 的区间导出为 unfinished
+    dangling = next(e for e in events if e["name"] == "tool:get_weather")
+    assert dangling["args"]["unfinished"] is True
+
+    meta = next(e for e in events if e["ph"] == "M")
+    assert trace.trace_id in meta["args"]["name"]
+
+
+def test_end_without_begin_is_ignored():
+    trace = TurnTrace()
+    trace.end("missing")
+    assert [e["ph"] for e in trace.to_chrome_trace()["traceEvents"]] == ["M"]
+
+
+def test_trace_span_noop_without_active_trace():
+    with tracing.trace_span("mcp:x") as args:
+        args["k"] = 1
+
+
+def test_trace_span_records_on_active_trace():
+    trace = TurnTrace()
+    token = tracing.activate(trace)
+    try:
+        with tracing.trace_span("mcp:get_component", cat="mcp", args={"a": 1}) as args:
+            args["result_bytes"] = 5
+    finally:
+        tracing.deactivate(token)
+
+    span = next(e for e in trace.to_chrome_trace()["traceEvents"] if e["name"] == "mcp:get_component")
+    assert span["cat"] == "mcp" and span["args"] == {"a": 1, "result_bytes": 5}
+
+
+def test_afinish_writes_file_off_loop_and_caps_directory(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRACE_DIR", str(tmp_path))
+    monkeypatch.setenv("TRACE_DIR_MAX_FILES", "3")
+    unrelated = tmp_path / "notes.json"
+    unrelated.write_text("{}")
+
+    paths = []
+    for _ in range(5):
+        trace = TurnTrace()
+        paths.append(asyncio.run(tracing.afinish(trace)))
+        # 保证 mtime 有先后
+        stamp = time.time() + len(paths)
+        os.utime(paths[-1], (stamp, stamp))
+
+    remaining = sorted(p.name for p in tmp_path.glob("*.json") if p != unrelated)
+    assert remaining == sorted(p.name for p in paths[-3:])
+    assert unrelated.exists()
+    assert json.loads(paths[-1].read_text())["otherData"]["trace_id"] == paths[-1].stem
+    assert tracing.get_recent_trace(paths[-1].stem) is not None
+
+
+def test_finish_without_trace_dir(monkeypatch):
+    monkeypatch.delenv("TRACE_DIR", raising=False)
+    trace = TurnTrace()
+    assert tracing.finish(trace) is None
+    assert tracing.list_recent_traces()[0]["trace_id"] == trace.trace_id
@@ -1,15 +1,25 @@
+import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from src.routes import chat, health
+from src.routes import chat, debug, health
+from llm_pool import aclose_http_clients
 
 # 加载环境变量
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # 关闭 Agent 共享的 LLM 连接池
+    await aclose_http_clients()
+
 app = FastAPI(
     title="A2UI Gateway",
     version="0.1.0",
     description="A2UI Gateway",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -22,3 +32,6 @@ app.add_middleware(
 
 app.include_router(health.router, prefix="/api")
 app.include_router(chat.router, prefix="/api/chat")
+# trace 中含完整 payload，debug 接口只在显式开启时注册
+if os.getenv("TRACE_DEBUG_ENDPOINT", "0").lower() in ("1", "true", "yes"):
+    app.include_router(debug.router, prefix="/api/debug")
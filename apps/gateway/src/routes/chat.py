@@ -1,9 +1,11 @@
 import json
+import os
 import re
+import random
 import asyncio
 from fastapi import APIRouter, Request
 from pydantic import BaseModel
-from sse_starlette import EventSourceResponse
+from src.sse_compression import CompressedEventSourceResponse
 
 import sys
 from pathlib import Path
@@ -13,9 +15,15 @@ AGENT_SRC = Path(__file__).resolve().parents[3] / "ai-agent" / "src"
 if str(AGENT_SRC) not in sys.path:
     sys.path.insert(0, str(AGENT_SRC))
 from agent import run_agent_stream
+import tracing
+from tracing import TurnTrace, payload_size
 
 router = APIRouter()
 
+# 请求头携带该字段（值为 1/true）时强制开启本轮 trace；
+# trace 含完整 payload 且可能落盘，只有设置 TRACE_HEADER_ENABLED=1 时才认这个请求头
+TRACE_HEADER = "x-a2ui-trace"
+
 class ChatRequest(BaseModel):
     message: str
     conversation_id: str | None = None
@@ -24,15 +32,20 @@ class ChatRequest(BaseModel):
 async def chat_stream(request: ChatRequest, req: Request):
     """SSE 流式聊天端点（支持 A2UI）"""
 
+    trace = TurnTrace("chat_stream") if should_trace(req) else None
+
     async def event_generator():
         processing_sent = False  # 跟踪是否已发送 processing
         accumulated_text = ""  # 累积所有文本用于解析 A2UI
+        trace_token = tracing.activate(trace) if trace else None
 
         try:
             async for event in run_agent_stream(
                 request.message,
                 request.conversation_id
             ):
+                if trace:
+                    record_trace_event(trace, event)
                 sse_event = transform_event(event, processing_sent)
                 if sse_event:
                     # 如果是 processing 事件，标记已发送
@@ -60,7 +73,9 @@ async def chat_stream(request: ChatRequest, req: Request):
                         }
 
             # 流结束后，尝试解析 A2UI JSON
-            a2ui_messages = extract_a2ui_json(accumulated_text)
+            with tracing.trace_span("extract_a2ui_json", cat="a2ui", args={"text_bytes": payload_size(accumulated_text)}) as span:
+                a2ui_messages = extract_a2ui_json(accumulated_text)
+                span["message_count"] = len(a2ui_messages)
 
             if a2ui_messages:
                 print(f"✅ Found {len(a2ui_messages)} A2UI messages")
@@ -86,8 +101,60 @@ async def chat_stream(request: ChatRequest, req: Request):
                 "event": "error",
                 "data": json.dumps({"error": str(e)})
             }
+        finally:
+            if trace:
+                tracing.deactivate(trace_token)
+
+    async def on_response_complete(compression_stats: dict | None) -> None:
+        # 响应完全结束（含压缩收尾 / 客户端断开）后再收尾 trace，落盘的文件才包含压缩统计
+        if not trace:
+            return
+        if compression_stats is not None:
+            trace.instant("sse_compression", cat="compression", args=compression_stats)
+        path = await tracing.afinish(trace)
+        print(f"🧭 Trace {trace.trace_id} recorded" + (f": {path}" if path else ""))
+
+    headers = {"X-Trace-Id": trace.trace_id} if trace else None
+    # 按 Accept-Encoding 协商流式压缩（每个事件单独 flush，不影响实时性）
+    return CompressedEventSourceResponse(
+        event_generator(),
+        headers=headers,
+        accept_encoding=req.headers.get("accept-encoding", ""),
+        on_complete=on_response_complete,
+    )
+
+def should_trace(req: Request) -> bool:
+    """是否为本轮请求开启 trace：请求头强制开启（需 TRACE_HEADER_ENABLED=1），或按 TRACE_SAMPLE_RATE 采样"""
+    if _env_flag("TRACE_HEADER_ENABLED") and req.headers.get(TRACE_HEADER, "").lower() in ("1", "true", "yes"):
+        return True
+    try:
+        sample_rate = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+    except ValueError:
+        return False
+    return sample_rate > 0 and random.random() < sample_rate
 
-    return EventSourceResponse(event_generator())
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "0").lower() in ("1", "true", "yes")
+
+def record_trace_event(trace: TurnTrace, event: dict) -> None:
+    """把一条 LangGraph 事件记录到 trace 时间线
+
+    on_*_start / on_*_end 按 run_id 配对成区间，其余事件（如 on_chat_model_stream）记为瞬时事件。
+    """
+    event_type = event.get("event", "")
+    run_id = str(event.get("run_id", ""))
+    name = event.get("name", "")
+    data = event.get("data", {})
+
+    if event_type.endswith("_start"):
+        kind = event_type[len("on_"):-len("_start")]
+        trace.begin(run_id, f"{kind}:{name}", cat=kind, args={"input_bytes": payload_size(data.get("input"))})
+    elif event_type.endswith("_end"):
+        trace.end(run_id, args={"output_bytes": payload_size(data.get("output"))})
+    else:
+        chunk = data.get("chunk")
+        size = payload_size(getattr(chunk, "content", chunk))
+        trace.instant(event_type, cat="stream", args={"name": name, "run_id": run_id, "bytes": size})
 
 def transform_event(event: dict, processing_sent: bool = False) -> dict | None:
     """转换 LangGraph 事件为前端格式"""
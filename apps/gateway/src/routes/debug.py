@@ -0,0 +1,24 @@
+import sys
+from pathlib import Path
+from fastapi import APIRouter, HTTPException
+
+# 与 chat 路由一致，基于文件绝对路径定位 ai-agent
+AGENT_SRC = Path(__file__).resolve().parents[3] / "ai-agent" / "src"
+if str(AGENT_SRC) not in sys.path:
+    sys.path.insert(0, str(AGENT_SRC))
+import tracing
+
+router = APIRouter()
+
+@router.get("/traces")
+async def list_traces():
+    """最近记录的 trace 列表（最新的在前）"""
+    return {"traces": tracing.list_recent_traces()}
+
+@router.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """Chrome trace / Perfetto JSON，可直接导入 ui.perfetto.dev 查看"""
+    trace = tracing.get_recent_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Trace not found: {trace_id}")
+    return trace.to_chrome_trace()
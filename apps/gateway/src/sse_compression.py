@@ -0,0 +1,312 @@
+"""SSE 流式压缩。
+
+按 Accept-Encoding 协商 zstd / br / gzip（zstd、br 需安装 zstandard、brotli），
+整条流共用一个压缩上下文（后面的事件可以引用前面事件里重复的 JSON 片段），
+每个事件写出后立即 flush，客户端仍然逐条实时收到事件。
+
+gzip 由 raw deflate + 手写 gzip 头尾实现，可以在流中途切换压缩级别：
+- 大小阈值：累计未压缩字节数达到 SSE_COMPRESSION_MIN_BYTES 之前用 level 0（stored block，几乎零 CPU），
+  短回答不为压缩付出 CPU
+- CPU 预算：单条流的压缩 CPU 时间超过 SSE_COMPRESSION_CPU_BUDGET_MS 后退回 level 0
+切换级别时用最近 32KB 明文作为新压缩器的字典，压缩上下文不丢失。
+zstd / br 使用固定的快速级别，不做中途切换；因此显式设置了 SSE_COMPRESSION_MIN_BYTES 或
+SSE_COMPRESSION_CPU_BUDGET_MS 时只协商 gzip，保证阈值与预算对每条压缩流都生效。
+
+配置（环境变量）：
+- SSE_COMPRESSION: auto（默认，按客户端支持自动选择）/ off / 逗号分隔的允许列表，如 "gzip,br"
+- SSE_COMPRESSION_MIN_BYTES: 默认 1024（未显式设置时不限制编码，阈值只作用于 gzip）
+- SSE_COMPRESSION_CPU_BUDGET_MS: 默认 0（不限制）
+"""
+
+import asyncio
+import inspect
+import os
+import struct
+import time
+import zlib
+from typing import Any, Awaitable, Callable
+
+from sse_starlette import EventSourceResponse
+
+# 可选依赖：未安装时只提供 gzip
+try:
+    import brotli  # type: ignore
+except Exception:  # pragma: no cover
+    try:
+        import brotlicffi as brotli  # type: ignore
+    except Exception:
+        brotli = None  # type: ignore
+try:
+    import zstandard  # type: ignore
+except Exception:  # pragma: no cover
+    zstandard = None  # type: ignore
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+DEFLATE_WINDOW = 32 * 1024
+# 服务端偏好顺序
+PREFERRED_ENCODINGS = ("zstd", "br", "gzip")
+# 只有支持中途切换级别的编码能执行大小阈值 / CPU 预算
+POLICY_ENV_VARS = ("SSE_COMPRESSION_MIN_BYTES", "SSE_COMPRESSION_CPU_BUDGET_MS")
+_warned_policy_restriction = False
+
+
+class GzipEncoder:
+    """可中途切换级别的 gzip 流（raw deflate + gzip 头尾）"""
+
+    name = "gzip"
+    supports_level_switch = True
+    _HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+    def __init__(self, level: int = GZIP_LEVEL):
+        self.level = level
+        self._compressor = self._new_compressor(level, b"")
+        self._crc = 0
+        self._size = 0
+        self._history = b""
+        self._header_sent = False
+
+    @staticmethod
+    def _new_compressor(level: int, zdict: bytes):
+        if zdict:
+            return zlib.compressobj(level, zlib.DEFLATED, -15, 8, zlib.Z_DEFAULT_STRATEGY, zdict)
+        return zlib.compressobj(level, zlib.DEFLATED, -15)
+
+    def set_level(self, level: int) -> None:
+        """切换压缩级别：上一段已 sync flush 到字节边界，新压缩器以最近 32KB 明文为字典接着写"""
+        if level == self.level:
+            return
+        self._compressor = self._new_compressor(level, self._history)
+        self.level = level
+
+    def _header(self) -> bytes:
+        if self._header_sent:
+            return b""
+        self._header_sent = True
+        return self._HEADER
+
+    def encode(self, data: bytes) -> bytes:
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._history = (self._history + data)[-DEFLATE_WINDOW:]
+        return self._header() + self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        trailer = struct.pack("<II", self._crc & 0xFFFFFFFF, self._size & 0xFFFFFFFF)
+        return self._header() + self._compressor.flush(zlib.Z_FINISH) + trailer
+
+
+class BrotliEncoder:
+    name = "br"
+    supports_level_switch = False
+
+    def __init__(self, quality: int = BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def encode(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdEncoder:
+    name = "zstd"
+    supports_level_switch = False
+
+    def __init__(self, level: int = ZSTD_LEVEL):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def encode(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+_ENCODERS = {"gzip": GzipEncoder, "br": BrotliEncoder, "zstd": ZstdEncoder}
+
+
+def available_encodings() -> list[str]:
+    """服务端可用且配置允许的编码，按偏好排序"""
+    setting = os.getenv("SSE_COMPRESSION", "auto").strip().lower()
+    if setting in ("off", "0", "false", "no", "none"):
+        return []
+    allowed = None if setting == "auto" else {s.strip() for s in setting.split(",")}
+    installed = {"gzip": True, "br": brotli is not None, "zstd": zstandard is not None}
+    encodings = [e for e in PREFERRED_ENCODINGS if installed[e] and (allowed is None or e in allowed)]
+    if any(os.getenv(name) for name in POLICY_ENV_VARS):
+        encodings = _restrict_to_level_switch(encodings)
+    return encodings
+
+
+def _restrict_to_level_switch(encodings: list[str]) -> list[str]:
+    """设置了阈值 / 预算时去掉无法执行它们的编码（首次去掉时打印一次提示）"""
+    global _warned_policy_restriction
+    kept = [e for e in encodings if _ENCODERS[e].supports_level_switch]
+    if kept != encodings and not _warned_policy_restriction:
+        _warned_policy_restriction = True
+        dropped = ", ".join(e for e in encodings if e not in kept)
+        print(f"⚠️  SSE compression threshold/CPU budget only applies to gzip, not negotiating: {dropped}")
+    return kept
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """解析 Accept-Encoding（含 q 值），返回选中的编码；不压缩时返回 None"""
+    accepted: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[token] = q
+
+    candidates = []
+    for rank, encoding in enumerate(available_encodings()):
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > 0:
+            candidates.append((-q, rank, encoding))
+    return min(candidates)[2] if candidates else None
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class StreamCompressor:
+    """单条流的压缩状态与统计"""
+
+    def __init__(self, encoding: str, min_bytes: int = 0, cpu_budget_ms: int = 0):
+        self.encoding = encoding
+        self.encoder = _ENCODERS[encoding]()
+        self.min_bytes = min_bytes
+        self.cpu_budget_s = cpu_budget_ms / 1000
+        self.full_level = getattr(self.encoder, "level", None)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+        self.over_budget = False
+        self.finished = False
+        if self.encoder.supports_level_switch and min_bytes > 0:
+            self.encoder.set_level(0)
+
+    def _apply_policy(self) -> None:
+        if not self.encoder.supports_level_switch:
+            return
+        if self.cpu_budget_s and self.cpu_seconds > self.cpu_budget_s:
+            if not self.over_budget:
+                print(f"⚠️  SSE compression CPU budget exceeded ({self.cpu_seconds * 1000:.1f}ms), storing uncompressed")
+            self.over_budget = True
+            self.encoder.set_level(0)
+        elif self.bytes_in >= self.min_bytes:
+            self.encoder.set_level(self.full_level)
+
+    def _timed(self, fn: Any, *args: Any) -> bytes:
+        start = time.thread_time()
+        out = fn(*args)
+        self.cpu_seconds += time.thread_time() - start
+        self.bytes_out += len(out)
+        return out
+
+    def compress(self, data: bytes) -> bytes:
+        self._apply_policy()
+        self.bytes_in += len(data)
+        return self._timed(self.encoder.encode, data)
+
+    def finish(self) -> bytes:
+        self.finished = True
+        return self._timed(self.encoder.finish)
+
+    def report(self) -> dict:
+        return {
+            "encoding": self.encoding,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": self.bytes_out / self.bytes_in if self.bytes_in else 1.0,
+            "cpu_ms": self.cpu_seconds * 1000,
+            "over_budget": self.over_budget,
+            "finished": self.finished,
+        }
+
+
+class CompressedEventSourceResponse(EventSourceResponse):
+    """按 Accept-Encoding 压缩的 EventSourceResponse，每个事件单独 flush
+
+    on_complete 在响应结束后调用（包括客户端中途断开，可以是 async 函数），参数为本条流的压缩统计，未压缩时为 None。
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        accept_encoding: str = "",
+        on_complete: Callable[[dict | None], Awaitable[None] | None] | None = None,
+        **kwargs: Any,
+    ):
+        super().__init__(*args, **kwargs)
+        self.encoding = negotiate_encoding(accept_encoding)
+        self.on_complete = on_complete
+
+    async def __call__(self, scope, receive, send) -> None:
+        compressor = None
+        try:
+            if self.encoding is None:
+                await super().__call__(scope, receive, send)
+            else:
+                compressor = self._new_compressor()
+                await super().__call__(scope, receive, self._compressed_send(compressor, send))
+        finally:
+            # 客户端断开时不会收到 more_body=False 的最后一条消息，统计放在 finally 里保证每条流都上报
+            stats = self._report(compressor) if compressor is not None else None
+            if self.on_complete is not None:
+                result = self.on_complete(stats)
+                if inspect.isawaitable(result):
+                    await result
+
+    def _new_compressor(self) -> StreamCompressor:
+        return StreamCompressor(
+            self.encoding,
+            min_bytes=_env_int("SSE_COMPRESSION_MIN_BYTES", 1024),
+            cpu_budget_ms=_env_int("SSE_COMPRESSION_CPU_BUDGET_MS", 0),
+        )
+
+    def _compressed_send(self, compressor: StreamCompressor, send: Any) -> Callable[[dict], Any]:
+        # sse-starlette 的 ping 任务与事件流并发调用 send：压缩器的输出必须按压缩顺序写出，
+        # 所以压缩和发送放在同一把锁里
+        lock = asyncio.Lock()
+
+        async def compressed_send(message: dict) -> None:
+            async with lock:
+                if message["type"] == "http.response.start":
+                    headers = [(k, v) for k, v in message.get("headers", []) if k.lower() != b"content-length"]
+                    headers.append((b"content-encoding", self.encoding.encode()))
+                    headers.append((b"vary", b"Accept-Encoding"))
+                    message = {**message, "headers": headers}
+                elif message["type"] == "http.response.body":
+                    body = compressor.compress(message["body"]) if message.get("body") else b""
+                    if not message.get("more_body", False):
+                        body += compressor.finish()
+                    message = {**message, "body": body}
+                await send(message)
+
+        return compressed_send
+
+    def _report(self, compressor: StreamCompressor) -> dict:
+        stats = compressor.report()
+        print(
+            f"🗜️  SSE {stats['encoding']}: {stats['bytes_in']} -> {stats['bytes_out']} bytes "
+            f"({stats['ratio']:.0%}), cpu {stats['cpu_ms']:.2f}ms"
+            + ("" if stats["finished"] else " (client disconnected)")
+        )
+        return stats
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# 与 uvicorn 启动时一致：以 apps/gateway 为根导入 src.*
+GATEWAY_ROOT = Path(__file__).resolve().parents[1]
+if str(GATEWAY_ROOT) not in sys.path:
+    sys.path.insert(0, str(GATEWAY_ROOT))
@@ -0,0 +1,57 @@
+import pytest
+
+chat = pytest.importorskip("src.routes.chat")
+
+from tracing import TurnTrace
+
+
+class FakeRequest:
+    def __init__(self, headers: dict):
+        self.headers = headers
+
+
+class Chunk:
+    def __init__(self, content: str):
+        self.content = content
+
+
+def _spans(trace: TurnTrace) -> dict:
+    return {e["name"]: e for e in trace.to_chrome_trace()["traceEvents"] if e["ph"] == "X"}
+
+
+def test_record_trace_event_pairs_start_and_end_by_run_id():
+    trace = TurnTrace()
+    chat.record_trace_event(trace, {"event": "on_chat_model_start", "run_id": "m1", "name": "ChatOpenAI", "data": {"input": "hi"}})
+    chat.record_trace_event(trace, {"event": "on_tool_start", "run_id": "t1", "name": "get_weather", "data": {"input": {"cities": ["北京"]}}})
+    chat.record_trace_event(trace, {"event": "on_chat_model_stream", "run_id": "m1", "name": "ChatOpenAI", "data": {"chunk": Chunk("你好")}})
+    chat.record_trace_event(trace, {"event": "on_tool_end", "run_id": "t1", "name": "get_weather", "data": {"output": "x" * 7}})
+    chat.record_trace_event(trace, {"event": "on_chat_model_end", "run_id": "m1", "name": "ChatOpenAI", "data": {"output": "done"}})
+
+    spans = _spans(trace)
+    assert spans["chat_model:ChatOpenAI"]["cat"] == "chat_model"
+    assert spans["chat_model:ChatOpenAI"]["args"] == {"input_bytes": 2, "output_bytes": 4}
+    assert spans["tool:get_weather"]["args"]["output_bytes"] == 7
+    assert not any(span["args"].get("unfinished") for span in spans.values())
+
+    stream = [e for e in trace.to_chrome_trace()["traceEvents"] if e["ph"] == "i"]
+    assert stream[0]["args"] == {"name": "ChatOpenAI", "run_id": "m1", "bytes": len("你好".encode())}
+
+
+def test_unmatched_start_is_exported_as_unfinished():
+    trace = TurnTrace()
+    chat.record_trace_event(trace, {"event": "on_tool_start", "run_id": "t1", "name": "web_search", "data": {}})
+    chat.record_trace_event(trace, {"event": "on_tool_end", "run_id": "other", "name": "web_search", "data": {}})
+
+    assert _spans(trace)["tool:web_search"]["args"]["unfinished"] is True
+
+
+def test_trace_header_requires_opt_in(monkeypatch):
+    monkeypatch.delenv("TRACE_SAMPLE_RATE", raising=False)
+    request = FakeRequest({chat.TRACE_HEADER: "1"})
+
+    monkeypatch.delenv("TRACE_HEADER_ENABLED", raising=False)
+    assert chat.should_trace(request) is False
+
+    monkeypatch.setenv("TRACE_HEADER_ENABLED", "1")
+    assert chat.should_trace(request) is True
+    assert chat.should_trace(FakeRequest({})) is False
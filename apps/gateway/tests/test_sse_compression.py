@@ -0,0 +1,255 @@
+import asyncio
+import gzip
+import zlib
+
+import pytest
+
+sse_compression = pytest.importorskip("src.sse_compression")
+
+from src.sse_compression import (
+    CompressedEventSourceResponse,
+    GzipEncoder,
+    StreamCompressor,
+    negotiate_encoding,
+)
+
+# 重复的 JSON 片段，模拟 A2UI 事件流
+EVENT = b'data: {"surfaceUpdate": {"components": [{"id": "card", "component": {"Text": {"text": "hello"}}}]}}\n\n'
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    for name in ("SSE_COMPRESSION", "SSE_COMPRESSION_MIN_BYTES", "SSE_COMPRESSION_CPU_BUDGET_MS"):
+        monkeypatch.delenv(name, raising=False)
+
+
+@pytest.fixture
+def gzip_only(monkeypatch):
+    monkeypatch.setattr(sse_compression, "brotli", None)
+    monkeypatch.setattr(sse_compression, "zstandard", None)
+
+
+def test_gzip_encoder_round_trip_with_level_switches():
+    encoder = GzipEncoder(level=0)
+    out = encoder.encode(EVENT * 3)
+    encoder.set_level(6)
+    out += encoder.encode(EVENT * 3)
+    encoder.set_level(0)
+    out += encoder.encode(EVENT)
+    out += encoder.finish()
+
+    assert out[:2] == b"\x1f\x8b"
+    assert gzip.decompress(out) == EVENT * 7
+
+
+def test_level_switch_seeds_compressor_with_history():
+    encoder = GzipEncoder(level=0)
+    encoder.encode(EVENT)
+    encoder.set_level(6)
+    # 新压缩器以之前的明文为字典，重复的事件只需要几个回溯引用
+    assert len(encoder.encode(EVENT)) < len(EVENT) // 4
+
+
+def test_empty_stream_is_valid_gzip():
+    assert gzip.decompress(GzipEncoder().finish()) == b""
+
+
+def test_stream_compressor_switches_level_at_threshold():
+    compressor = StreamCompressor("gzip", min_bytes=len(EVENT) * 2)
+    out = b""
+    levels = []
+    for _ in range(4):
+        out += compressor.compress(EVENT)
+        levels.append(compressor.encoder.level)
+    out += compressor.finish()
+
+    assert levels == [0, 0, 6, 6]
+    assert gzip.decompress(out) == EVENT * 4
+    assert compressor.report()["finished"]
+
+
+def test_stream_compressor_falls_back_to_stored_over_cpu_budget(monkeypatch):
+    clock = iter(i * 0.01 for i in range(1000))
+    monkeypatch.setattr(sse_compression.time, "thread_time", lambda: next(clock))
+    compressor = StreamCompressor("gzip", cpu_budget_ms=5)
+
+    out = compressor.compress(EVENT)
+    assert compressor.encoder.level == 6
+    out += compressor.compress(EVENT)
+    out += compressor.finish()
+
+    assert compressor.over_budget
+    assert compressor.encoder.level == 0
+    assert gzip.decompress(out) == EVENT * 2
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        ("gzip", "gzip"),
+        ("GZIP;q=0.5", "gzip"),
+        ("gzip;q=0", None),
+        ("gzip;q=abc", None),
+        ("*", "gzip"),
+        ("*;q=0", None),
+        ("gzip;q=0, *", None),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_negotiate_encoding_q_values(gzip_only, accept, expected):
+    assert negotiate_encoding(accept) == expected
+
+
+def test_negotiate_encoding_prefers_client_q_then_server_order(monkeypatch):
+    monkeypatch.setattr(sse_compression, "brotli", object())
+    monkeypatch.setattr(sse_compression, "zstandard", None)
+
+    assert negotiate_encoding("gzip, br") == "br"
+    assert negotiate_encoding("gzip;q=1, br;q=0.5") == "gzip"
+    assert negotiate_encoding("br;q=0, *") == "gzip"
+
+
+def test_negotiate_encoding_respects_config(monkeypatch):
+    monkeypatch.setattr(sse_compression, "brotli", object())
+
+    monkeypatch.setenv("SSE_COMPRESSION", "off")
+    assert negotiate_encoding("gzip, br") is None
+
+    monkeypatch.setenv("SSE_COMPRESSION", "gzip")
+    assert negotiate_encoding("br, gzip;q=0.1") == "gzip"
+
+    # 设置了阈值 / 预算时只协商能中途切换级别的 gzip
+    monkeypatch.setenv("SSE_COMPRESSION", "auto")
+    monkeypatch.setenv("SSE_COMPRESSION_MIN_BYTES", "1")
+    assert negotiate_encoding("br") is None
+    assert negotiate_encoding("gzip, br") == "gzip"
+
+
+def test_concurrent_sends_keep_compressed_order(gzip_only):
+    response = CompressedEventSourceResponse(iter([]), accept_encoding="gzip")
+    compressor = StreamCompressor("gzip")
+    sent = []
+    calls = []
+
+    async def send(message):
+        # 第一条消息发送较慢，期间另一条消息（如 ping）也在发送
+        calls.append(message)
+        if len(calls) == 1:
+            await asyncio.sleep(0.01)
+        sent.append(message["body"])
+
+    async def scenario():
+        compressed_send = response._compressed_send(compressor, send)
+        await asyncio.gather(
+            compressed_send({"type": "http.response.body", "body": b"event: a\n\n", "more_body": True}),
+            compressed_send({"type": "http.response.body", "body": b": ping\n\n", "more_body": True}),
+        )
+        await compressed_send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    run(scenario())
+
+    assert gzip.decompress(b"".join(sent)) == b"event: a\n\n: ping\n\n"
+
+
+def _scope() -> dict:
+    return {"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": b""}
+
+
+def test_finished_stream_decompresses_and_reports(gzip_only):
+    reports = []
+
+    async def events():
+        for i in range(3):
+            yield {"data": f"event {i}"}
+
+    async def receive():
+        await asyncio.sleep(10)
+        return {"type": "http.disconnect"}
+
+    async def scenario():
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        response = CompressedEventSourceResponse(events(), accept_encoding="gzip", on_complete=reports.append, ping=0)
+        await response(_scope(), receive, send)
+        return sent
+
+    sent = run(scenario())
+
+    headers = dict(sent[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    body = gzip.decompress(b"".join(m.get("body", b"") for m in sent[1:]))
+    assert body.count(b"data: event") == 3
+    assert reports[0]["finished"] is True
+    assert reports[0]["bytes_in"] == len(body)
+
+
+def test_disconnect_still_calls_on_complete(gzip_only):
+    reports = []
+
+    async def on_complete(stats):
+        reports.append(stats)
+
+    async def events():
+        yield {"data": "first"}
+        await asyncio.Event().wait()
+
+    async def scenario():
+        sent = []
+        first_event_sent = asyncio.Event()
+
+        async def send(message):
+            sent.append(message)
+            if message.get("body"):
+                first_event_sent.set()
+
+        async def receive():
+            await first_event_sent.wait()
+            return {"type": "http.disconnect"}
+
+        response = CompressedEventSourceResponse(events(), accept_encoding="gzip", on_complete=on_complete, ping=0)
+        await asyncio.wait_for(response(_scope(), receive, send), timeout=5)
+        return sent
+
+    sent = run(scenario())
+
+    # 断开时没有 gzip 尾部，已发出的部分仍可以流式解压
+    partial = zlib.decompressobj(31).decompress(b"".join(m.get("body", b"") for m in sent[1:]))
+    assert b"data: first" in partial
+    assert len(reports) == 1
+    assert reports[0]["finished"] is False
+    assert reports[0]["bytes_in"] == len(partial)
+
+
+def test_uncompressed_response_reports_none(gzip_only):
+    reports = []
+
+    async def events():
+        yield {"data": "plain"}
+
+    async def receive():
+        await asyncio.sleep(10)
+        return {"type": "http.disconnect"}
+
+    async def scenario():
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        response = CompressedEventSourceResponse(events(), accept_encoding="identity", on_complete=reports.append, ping=0)
+        await response(_scope(), receive, send)
+        return sent
+
+    sent = run(scenario())
+
+    assert b"data: plain" in b"".join(m.get("body", b"") for m in sent[1:])
+    assert reports == [None]